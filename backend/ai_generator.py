@@ -1,8 +1,40 @@
+import asyncio
+import json
+import logging
 import anthropic
-from typing import List, Optional, Dict, Any
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Generator, List, Optional, Dict, Any, FrozenSet, Tuple
 from enum import Enum
 from dataclasses import dataclass, field
 
+logger = logging.getLogger(__name__)
+
+# Addendum for follow-up rounds, sent as its own cacheable system block
+FOLLOWUP_SUFFIX = """You are now in a follow-up round. You have access to previous tool results and can make additional tool calls to:
+- Compare information across different sources
+- Search for additional details based on previous results
+- Synthesize information from multiple searches
+
+Consider the previous tool results and determine if you need more information to provide a complete answer."""
+
+# Text alongside final-round tool calls at least this long is returned as the answer,
+# without running those calls
+MIN_ANSWER_LEN = 200
+
+# Message of the GenerationError raised when an API call or tool fails
+ERROR_RESPONSE = "I encountered an error while processing your request. Please try again."
+
+# Steps the conversation state machine asks its driver to perform
+API_CALL = "api_call"
+RUN_TOOLS = "run_tools"
+
+FOLLOWUP_BLOCK = {"type": "text", "text": FOLLOWUP_SUFFIX, "cache_control": {"type": "ephemeral"}}
+
+
+class GenerationError(Exception):
+    """No answer could be generated; the message is safe to show the user."""
+
 
 class ConversationState(Enum):
     INITIAL = "initial"
@@ -17,21 +49,24 @@ class ConversationContext:
     state: ConversationState = ConversationState.INITIAL
     round_number: int = 0
     max_rounds: int = 2
-    system_content: str = ""
+    system_content: Optional[List[Dict[str, Any]]] = None  # Base system blocks, built once per conversation
     tool_execution_errors: List[str] = field(default_factory=list)
-    rollback_point: Optional[Dict[str, Any]] = None
+    system_prompt_cache: Dict[ConversationState, List[Dict[str, Any]]] = field(default_factory=dict, repr=False)
+
+
+_NO_TRANSITIONS: FrozenSet[ConversationState] = frozenset()
+_VALID_TRANSITIONS: Dict[ConversationState, FrozenSet[ConversationState]] = {
+    ConversationState.INITIAL: frozenset({ConversationState.TOOL_EXECUTING, ConversationState.COMPLETE}),
+    ConversationState.TOOL_EXECUTING: frozenset({ConversationState.AWAITING_FOLLOWUP, ConversationState.COMPLETE}),
+    ConversationState.AWAITING_FOLLOWUP: frozenset({ConversationState.TOOL_EXECUTING, ConversationState.COMPLETE}),
+    ConversationState.COMPLETE: _NO_TRANSITIONS,
+}
 
 
 class StateTransitionManager:
     @staticmethod
     def can_transition(current_state: ConversationState, new_state: ConversationState) -> bool:
-        valid_transitions = {
-            ConversationState.INITIAL: [ConversationState.TOOL_EXECUTING, ConversationState.COMPLETE],
-            ConversationState.TOOL_EXECUTING: [ConversationState.AWAITING_FOLLOWUP, ConversationState.COMPLETE],
-            ConversationState.AWAITING_FOLLOWUP: [ConversationState.TOOL_EXECUTING, ConversationState.COMPLETE],
-            ConversationState.COMPLETE: []
-        }
-        return new_state in valid_transitions.get(current_state, [])
+        return new_state in _VALID_TRANSITIONS.get(current_state, _NO_TRANSITIONS)
     
     @staticmethod
     def transition(context: ConversationContext, new_state: ConversationState) -> bool:
@@ -45,39 +80,34 @@ class ConversationBuilder:
     def __init__(self, ai_generator):
         self.ai_generator = ai_generator
     
-    def build_system_prompt(self, context: ConversationContext) -> str:
-        # Use the context's system_content if it includes conversation history
-        base_prompt = context.system_content if context.system_content else self.ai_generator.SYSTEM_PROMPT
-        
-        if context.state == ConversationState.INITIAL:
-            return base_prompt
-        elif context.state == ConversationState.AWAITING_FOLLOWUP:
-            return base_prompt + """
-
-You are now in a follow-up round. You have access to previous tool results and can make additional tool calls to:
-- Compare information across different sources
-- Search for additional details based on previous results
-- Synthesize information from multiple searches
-
-Consider the previous tool results and determine if you need more information to provide a complete answer."""
-        else:
-            return base_prompt
+    def build_system_content(self, conversation_history: Optional[str]) -> List[Dict[str, Any]]:
+        # Static prompt block first so it stays a cacheable prefix; history follows it
+        if not conversation_history:
+            return self.ai_generator.cached_system
+        return self.ai_generator.cached_system + [
+            {"type": "text", "text": f"Previous conversation:\n{conversation_history}"}
+        ]
     
-    def create_rollback_point(self, context: ConversationContext):
-        context.rollback_point = {
-            "messages": context.messages.copy(),
-            "round_number": context.round_number,
-            "state": context.state
-        }
+    def build_base_system(self, context: ConversationContext) -> List[Dict[str, Any]]:
+        if context.system_content is None:
+            context.system_content = self.build_system_content(None)
+        return context.system_content
     
-    def rollback(self, context: ConversationContext) -> bool:
-        if context.rollback_point:
-            context.messages = context.rollback_point["messages"]
-            context.round_number = context.rollback_point["round_number"]
-            context.state = context.rollback_point["state"]
-            context.rollback_point = None
-            return True
-        return False
+    def build_system_prompt(self, context: ConversationContext) -> List[Dict[str, Any]]:
+        # System content is fixed for the conversation, so the prompt only varies by state
+        cached = context.system_prompt_cache.get(context.state)
+        if cached is not None:
+            return cached
+        
+        base_blocks = self.build_base_system(context)
+        
+        if context.state == ConversationState.AWAITING_FOLLOWUP:
+            prompt = base_blocks + [FOLLOWUP_BLOCK]
+        else:
+            prompt = base_blocks
+        
+        context.system_prompt_cache[context.state] = prompt
+        return prompt
 
 
 class AIGenerator:
@@ -117,9 +147,19 @@ The get_course_outline tool returns complete course information with all lesson
     
     def __init__(self, api_key: str, model: str):
         self.client = anthropic.Anthropic(api_key=api_key)
+        # Explicit keep-alive pool so bursts of tool rounds reuse open connections
+        self._http = anthropic.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        self.async_client = anthropic.AsyncAnthropic(api_key=api_key, http_client=self._http)
         self.model = model
         self.conversation_builder = ConversationBuilder(self)
         
+        # Static system prompt marked as a prompt-cache breakpoint
+        self.cached_system = [
+            {"type": "text", "text": self.SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+        ]
+        
         # Pre-build base API parameters
         self.base_params = {
             "model": self.model,
@@ -142,96 +182,241 @@ The get_course_outline tool returns complete course information with all lesson
             
         Returns:
             Generated response as string
+            
+        Raises:
+            GenerationError: An API call or tool failed
         """
         # Initialize conversation context
         context = ConversationContext()
         context.messages = [{"role": "user", "content": query}]
-        context.system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history 
-            else self.SYSTEM_PROMPT
-        )
+        context.system_content = self.conversation_builder.build_system_content(conversation_history)
         
         # Use state machine to handle the conversation
-        return self._handle_sequential_conversation(context, tools, tool_manager)
+        return self._handle_sequential_conversation(context, self._with_cache_breakpoint(tools), tool_manager)
+    
+    async def aclose(self):
+        """Close the pooled HTTP connections used by the async client"""
+        await self.async_client.close()
+    
+    @staticmethod
+    def _answer_from_response(response) -> Optional[str]:
+        """Return text written alongside tool calls if it is long enough to stand as the answer."""
+        text = "".join(block.text for block in response.content if block.type == "text").strip()
+        return text if len(text) > MIN_ANSWER_LEN else None
+    
+    @staticmethod
+    def _with_cache_breakpoint(tools: Optional[List]) -> Optional[List]:
+        """Return a copy of the tool list with a prompt-cache breakpoint on the last definition."""
+        if not tools:
+            return tools
+        return tools[:-1] + [{**tools[-1], "cache_control": {"type": "ephemeral"}}]
     
-    def _handle_sequential_conversation(self, context: ConversationContext, tools: Optional[List] = None, tool_manager=None) -> str:
+    @staticmethod
+    def _log_cache_usage(response):
+        """Log prompt-cache usage reported by the API."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            logger.debug(
+                "Prompt cache: read=%s created=%s",
+                getattr(usage, "cache_read_input_tokens", None),
+                getattr(usage, "cache_creation_input_tokens", None)
+            )
+    
+    def _conversation_steps(self, context: ConversationContext, tools: Optional[List] = None,
+                            tool_manager=None, synthesize: bool = True) -> Generator[Tuple[str, Any], Any, Optional[str]]:
         """
-        Handle sequential conversation using state machine pattern.
+        The conversation state machine, shared by the sync and async drivers.
+        
+        It does no I/O itself: it yields each step it needs and is sent back
+        the outcome, or has the step's exception thrown back in.
+        
+            (API_CALL, params)     -> the API response
+            (RUN_TOOLS, tool_uses) -> one result string per tool_use block
         
         Args:
             context: Current conversation context with state and messages
             tools: Available tools for AI to use
             tool_manager: Manager to execute tools
+            synthesize: Whether to make the final synthesis call once the tool
+                rounds run out; astream_response streams that call itself
             
         Returns:
-            Final response text after all rounds
+            Final response text, or None if synthesis was left to the caller
+            
+        Raises:
+            GenerationError: An API call or tool failed
         """
         while context.state != ConversationState.COMPLETE and context.round_number < context.max_rounds:
+            # Messages are only ever appended, so this length is the round's rollback point
+            pre_len = len(context.messages)
             try:
-                # Create rollback point before each round
-                self.conversation_builder.create_rollback_point(context)
-                
                 # Make API call for current round
-                response = self._make_api_call(context, tools)
+                response = yield API_CALL, self._build_api_params(context, tools)
+                self._log_cache_usage(response)
                 
-                # Check if response contains tool use
-                has_tool_use = any(block.type == "tool_use" for block in response.content)
+                # Collect tool use blocks in a single pass over the response
+                tool_uses = [block for block in response.content if block.type == "tool_use"]
                 
-                if has_tool_use and tool_manager:
-                    # Transition to tool executing state
-                    StateTransitionManager.transition(context, ConversationState.TOOL_EXECUTING)
-                    
-                    # Add assistant response to conversation
-                    context.messages.append({"role": "assistant", "content": response.content})
-                    
-                    # Execute tools and add results
-                    if self._execute_tools_for_round(response, context, tool_manager):
-                        # Increment round and transition to awaiting followup
-                        context.round_number += 1
-                        if context.round_number < context.max_rounds:
-                            StateTransitionManager.transition(context, ConversationState.AWAITING_FOLLOWUP)
-                        else:
-                            # Final round - make one more call to get synthesis
-                            final_response = self._make_final_api_call(context)
-                            StateTransitionManager.transition(context, ConversationState.COMPLETE)
-                            return final_response.content[0].text
-                    else:
-                        # Tool execution failed, rollback and return error
-                        self.conversation_builder.rollback(context)
-                        return "I encountered an error while processing your request. Please try again."
-                else:
+                if not (tool_uses and tool_manager):
                     # No tool use - this is the final response
                     StateTransitionManager.transition(context, ConversationState.COMPLETE)
                     return response.content[0].text
+                
+                if context.round_number + 1 >= context.max_rounds:
+                    # Final round - text that can stand as the answer ends the conversation
+                    # before this round's tools run, so no tool results or sources go unused
+                    answer = self._answer_from_response(response)
+                    if answer is not None:
+                        StateTransitionManager.transition(context, ConversationState.COMPLETE)
+                        return answer
+                
+                # Transition to tool executing state
+                StateTransitionManager.transition(context, ConversationState.TOOL_EXECUTING)
+                
+                # Add assistant response to conversation, then execute tools and add results
+                context.messages.append({"role": "assistant", "content": response.content})
+                results = yield RUN_TOOLS, tool_uses
+                self._append_tool_results(context, tool_uses, results)
+                
+                # Increment round and transition to awaiting followup
+                context.round_number += 1
+                if context.round_number < context.max_rounds:
+                    StateTransitionManager.transition(context, ConversationState.AWAITING_FOLLOWUP)
                     
             except Exception as e:
-                # Handle API or other errors
+                # API or tool error: drop this round's messages and fail the request
                 context.tool_execution_errors.append(str(e))
-                if self.conversation_builder.rollback(context):
-                    return "I encountered an error while processing your request. Please try again."
-                else:
-                    return f"An error occurred: {str(e)}"
+                del context.messages[pre_len:]
+                raise GenerationError(ERROR_RESPONSE) from e
         
-        # If we've completed max rounds, make final synthesis call
-        if context.state != ConversationState.COMPLETE:
+        # Max rounds completed without a final answer - make final synthesis call
+        if not synthesize:
+            return None
+        try:
+            final_response = yield API_CALL, self._build_final_api_params(context)
+        except Exception as e:
+            context.tool_execution_errors.append(str(e))
+            raise GenerationError(ERROR_RESPONSE) from e
+        self._log_cache_usage(final_response)
+        StateTransitionManager.transition(context, ConversationState.COMPLETE)
+        return final_response.content[0].text
+    
+    def _handle_sequential_conversation(self, context: ConversationContext, tools: Optional[List] = None,
+                                        tool_manager=None, synthesize: bool = True) -> Optional[str]:
+        """Run the conversation state machine with blocking API and tool calls."""
+        steps = self._conversation_steps(context, tools, tool_manager, synthesize)
+        outcome, error = None, None
+        while True:
+            try:
+                step, payload = steps.send(outcome) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            outcome, error = None, None
+            try:
+                if step == API_CALL:
+                    outcome = self.client.messages.create(**payload)
+                else:
+                    outcome = self._execute_tools_for_round(payload, tool_manager)
+            except Exception as e:
+                error = e
+    
+    async def _ahandle_sequential_conversation(self, context: ConversationContext, tools: Optional[List] = None,
+                                               tool_manager=None, synthesize: bool = True) -> Optional[str]:
+        """Run the conversation state machine, awaiting API calls and running tools off the event loop."""
+        steps = self._conversation_steps(context, tools, tool_manager, synthesize)
+        outcome, error = None, None
+        while True:
+            try:
+                step, payload = steps.send(outcome) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            outcome, error = None, None
             try:
-                final_response = self._make_final_api_call(context)
-                return final_response.content[0].text
-            except Exception:
-                return "I've gathered information but encountered an error in the final response. Please try again."
+                if step == API_CALL:
+                    outcome = await self.async_client.messages.create(**payload)
+                else:
+                    outcome = await self._aexecute_tools_for_round(payload, tool_manager)
+            except Exception as e:
+                error = e
+    
+    async def agenerate_response(self, query: str,
+                                 conversation_history: Optional[str] = None,
+                                 tools: Optional[List] = None,
+                                 tool_manager=None) -> str:
+        """
+        Async variant of generate_response that awaits the Anthropic API
+        instead of blocking the event loop.
+        
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            
+        Returns:
+            Generated response as string
+            
+        Raises:
+            GenerationError: An API call or tool failed
+        """
+        context = ConversationContext()
+        context.messages = [{"role": "user", "content": query}]
+        context.system_content = self.conversation_builder.build_system_content(conversation_history)
         
-        return "No response generated."
+        return await self._ahandle_sequential_conversation(context, self._with_cache_breakpoint(tools), tool_manager)
     
-    def _make_api_call(self, context: ConversationContext, tools: Optional[List] = None):
-        """Make API call to Claude with current conversation state."""
+    async def astream_response(self, query: str,
+                               conversation_history: Optional[str] = None,
+                               tools: Optional[List] = None,
+                               tool_manager=None) -> AsyncIterator[str]:
+        """
+        Generate a response like agenerate_response, yielding text as it is produced.
+        
+        Tool rounds run to completion first since their full output is needed
+        for the next round; only the final synthesis call is streamed.
+        
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            
+        Yields:
+            Chunks of response text
+            
+        Raises:
+            GenerationError: An API call or tool failed, possibly after some
+                text was already yielded
+        """
+        context = ConversationContext()
+        context.messages = [{"role": "user", "content": query}]
+        context.system_content = self.conversation_builder.build_system_content(conversation_history)
+        
+        answer = await self._ahandle_sequential_conversation(
+            context, self._with_cache_breakpoint(tools), tool_manager, synthesize=False
+        )
+        if answer is not None:
+            yield answer
+            return
+        
+        try:
+            async with self.async_client.messages.stream(**self._build_final_api_params(context)) as stream:
+                async for text in stream.text_stream:
+                    yield text
+            StateTransitionManager.transition(context, ConversationState.COMPLETE)
+        except Exception as e:
+            context.tool_execution_errors.append(str(e))
+            raise GenerationError(ERROR_RESPONSE) from e
+    
+    def _build_api_params(self, context: ConversationContext, tools: Optional[List] = None) -> Dict[str, Any]:
+        """Build API parameters for the current conversation state."""
         # Build system prompt based on current state
         system_prompt = self.conversation_builder.build_system_prompt(context)
         
         # Prepare API parameters
         api_params = {
             **self.base_params,
-            "messages": context.messages.copy(),
+            "messages": context.messages,
             "system": system_prompt
         }
         
@@ -240,41 +425,92 @@ The get_course_outline tool returns complete course information with all lesson
             api_params["tools"] = tools
             api_params["tool_choice"] = {"type": "auto"}
         
-        return self.client.messages.create(**api_params)
+        return api_params
     
-    def _make_final_api_call(self, context: ConversationContext):
-        """Make final API call without tools for synthesis."""
-        api_params = {
+    def _build_final_api_params(self, context: ConversationContext) -> Dict[str, Any]:
+        """Build API parameters for the final synthesis call without tools."""
+        return {
             **self.base_params,
-            "messages": context.messages.copy(),
-            "system": context.system_content
+            "messages": context.messages,
+            "system": self.conversation_builder.build_base_system(context)
         }
-        return self.client.messages.create(**api_params)
     
-    def _execute_tools_for_round(self, response, context: ConversationContext, tool_manager) -> bool:
-        """Execute all tool calls for current round and add results to context."""
-        tool_results = []
+    @staticmethod
+    def _tool_concurrency(tool_manager, tool_count: int) -> int:
+        """Number of tool calls to run at once, capped by the tool manager's limit."""
+        return max(1, min(tool_count, getattr(tool_manager, "max_concurrency", 4)))
+    
+    @staticmethod
+    def _dedupe_tool_calls(tool_uses: List) -> Tuple[List, List[int]]:
+        """Collapse identical (name, input) calls; returns the unique calls and each call's index into them."""
+        unique_calls = []
+        positions = []
+        seen: Dict[Tuple[str, str], int] = {}
+        for block in tool_uses:
+            key = (block.name, json.dumps(block.input, sort_keys=True))
+            if key not in seen:
+                seen[key] = len(unique_calls)
+                unique_calls.append(block)
+            positions.append(seen[key])
+        return unique_calls, positions
+    
+    @staticmethod
+    def _execute_batched_tools(unique_calls: List, tool_manager) -> Dict[int, str]:
+        """Let the tool manager run batch-capable calls together; returns results by call index."""
+        execute_batched = getattr(tool_manager, "execute_batched", None)
+        if execute_batched is None:
+            return {}
+        return execute_batched([(block.name, block.input) for block in unique_calls])
+    
+    @staticmethod
+    def _append_tool_results(context: ConversationContext, tool_uses: List, results: List[str]):
+        """Add tool results to the conversation, keeping them paired with their tool_use ids."""
+        tool_results = [
+            {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": result
+            }
+            for block, result in zip(tool_uses, results)
+        ]
         
-        try:
-            for content_block in response.content:
-                if content_block.type == "tool_use":
-                    tool_result = tool_manager.execute_tool(
-                        content_block.name,
-                        **content_block.input
-                    )
-                    
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": content_block.id,
-                        "content": tool_result
-                    })
-            
-            # Add tool results to conversation
-            if tool_results:
-                context.messages.append({"role": "user", "content": tool_results})
-            
-            return True
-            
-        except Exception as e:
-            context.tool_execution_errors.append(str(e))
-            return False
\ No newline at end of file
+        if tool_results:
+            context.messages.append({"role": "user", "content": tool_results})
+    
+    def _execute_tools_for_round(self, tool_uses: List, tool_manager) -> List[str]:
+        """Execute all tool calls for current round concurrently; returns one result per tool_use block."""
+        # Identical calls in one turn run once; every tool_use id still gets a result
+        unique_calls, positions = self._dedupe_tool_calls(tool_uses)
+        
+        # Repeated searches share one embedding pass; everything else runs per call
+        unique_results = self._execute_batched_tools(unique_calls, tool_manager)
+        pending = [i for i in range(len(unique_calls)) if i not in unique_results]
+        
+        def run_call(i):
+            return tool_manager.execute_tool(unique_calls[i].name, **unique_calls[i].input)
+        
+        workers = self._tool_concurrency(tool_manager, len(pending))
+        if workers > 1:
+            # Independent tool calls run in parallel; map preserves input order
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                unique_results.update(zip(pending, executor.map(run_call, pending)))
+        else:
+            unique_results.update((i, run_call(i)) for i in pending)
+        
+        return [unique_results[i] for i in positions]
+    
+    async def _aexecute_tools_for_round(self, tool_uses: List, tool_manager) -> List[str]:
+        """Async variant of _execute_tools_for_round; blocking tools run in worker threads."""
+        unique_calls, positions = self._dedupe_tool_calls(tool_uses)
+        
+        async def run_tool(block):
+            async with semaphore:
+                return await asyncio.to_thread(tool_manager.execute_tool, block.name, **block.input)
+        
+        unique_results = await asyncio.to_thread(self._execute_batched_tools, unique_calls, tool_manager)
+        pending = [i for i in range(len(unique_calls)) if i not in unique_results]
+        semaphore = asyncio.Semaphore(self._tool_concurrency(tool_manager, len(pending)))
+        
+        pending_results = await asyncio.gather(*(run_tool(unique_calls[i]) for i in pending))
+        unique_results.update(zip(pending, pending_results))
+        return [unique_results[i] for i in positions]
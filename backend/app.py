@@ -4,13 +4,32 @@ warnings.filterwarnings("ignore", message="resource_tracker: There appear to be.
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
+import json
+import logging
+import logging.handlers
 import os
+import queue
 
 from config import config
 from rag_system import RAGSystem
+from response_cache import ResponseCache
+
+# Log through a queue so request handlers never block on stream writes;
+# the listener thread does the actual writing. The queue handler is only
+# attached while the listener runs (startup to shutdown), so imports without
+# a lifespan never fill a queue that nothing drains
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(levelname)s:     %(message)s"))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+
+logger = logging.getLogger("rag")
+logger.setLevel(logging.INFO)
 
 # Initialize FastAPI app
 app = FastAPI(title="Course Materials RAG System", root_path="")
@@ -34,6 +53,10 @@ app.add_middleware(
 # Initialize RAG system
 rag_system = RAGSystem(config)
 
+# Cache of answers for repeated queries (temperature is 0, so responses are deterministic)
+response_cache = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL)
+tools_hash = ResponseCache.hash_tools(rag_system.tool_manager.get_tool_definitions())
+
 # Pydantic models for request/response
 class QueryRequest(BaseModel):
     """Request model for course queries"""
@@ -45,12 +68,6 @@ class SourceInfo(BaseModel):
     title: str
     lesson_number: Optional[int] = None  
     link: Optional[str] = None
-    
-    class Config:
-        """Ensure proper JSON serialization"""
-        json_encoders = {
-            # Ensure all fields are properly serialized
-        }
 
 class QueryResponse(BaseModel):
     """Response model for course queries"""
@@ -63,6 +80,26 @@ class CourseStats(BaseModel):
     total_courses: int
     course_titles: List[str]
 
+def to_source_infos(sources: List) -> List[SourceInfo]:
+    """Convert tool sources to SourceInfo objects"""
+    source_objects = []
+    for source in sources:
+        if isinstance(source, dict):
+            # New structured format
+            source_objects.append(SourceInfo(
+                title=source.get('title', 'Unknown'),
+                lesson_number=source.get('lesson_number'),
+                link=source.get('link')
+            ))
+        else:
+            # Fallback for string format (backward compatibility)  
+            source_objects.append(SourceInfo(title=str(source)))
+    return source_objects
+
+def sse_event(data: dict) -> str:
+    """Format a payload as a server-sent event"""
+    return f"data: {json.dumps(data)}\n\n"
+
 # API Endpoints
 
 @app.post("/api/query", response_model=QueryResponse)
@@ -74,32 +111,72 @@ async def query_documents(request: QueryRequest):
         if not session_id:
             session_id = rag_system.session_manager.create_session()
         
-        # Process query using RAG system
-        answer, sources = rag_system.query(request.query, session_id)
-        
+        # Serve repeated queries with the same conversation history from cache
+        history = rag_system.session_manager.get_conversation_history(session_id)
+        cache_key = ResponseCache.make_key(request.query, history, tools_hash)
+        cached = response_cache.get(cache_key)
         
-        # Convert sources to SourceInfo objects
-        source_objects = []
-        for source in sources:
-            if isinstance(source, dict):
-                # New structured format
-                source_objects.append(SourceInfo(
-                    title=source.get('title', 'Unknown'),
-                    lesson_number=source.get('lesson_number'),
-                    link=source.get('link')
-                ))
-            else:
-                # Fallback for string format (backward compatibility)  
-                source_objects.append(SourceInfo(title=str(source)))
+        if cached is not None:
+            answer, sources = cached
+            rag_system.session_manager.add_exchange(session_id, request.query, answer)
+        else:
+            # Process query using RAG system; a failed generation raises
+            # GenerationError, so it is reported as an error and never cached
+            answer, sources = await rag_system.aquery(request.query, session_id)
+            response_cache.put(cache_key, (answer, sources))
         
-        return QueryResponse(
+        # Serialize in pydantic-core directly rather than via FastAPI's jsonable_encoder pass
+        query_response = QueryResponse(
             answer=answer,
-            sources=source_objects,
+            sources=to_source_infos(sources),
             session_id=session_id
         )
+        return Response(content=query_response.model_dump_json(), media_type="application/json")
     except Exception as e:
+        logger.exception("Query failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """Process a query and stream the answer as server-sent events"""
+    # Create session if not provided
+    session_id = request.session_id
+    if not session_id:
+        session_id = rag_system.session_manager.create_session()
+    
+    history = rag_system.session_manager.get_conversation_history(session_id)
+    cache_key = ResponseCache.make_key(request.query, history, tools_hash)
+    
+    async def event_stream():
+        try:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                answer, sources = cached
+                rag_system.session_manager.add_exchange(session_id, request.query, answer)
+                yield sse_event({"delta": answer})
+            else:
+                parts = []
+                sources = []
+                async for event in rag_system.astream_query(request.query, session_id):
+                    if "delta" in event:
+                        parts.append(event["delta"])
+                        yield sse_event(event)
+                    else:
+                        sources = event["sources"]
+                # Only reached once the whole answer streamed; a GenerationError skips it
+                response_cache.put(cache_key, ("".join(parts), sources))
+            
+            yield sse_event({
+                "sources": [source.model_dump() for source in to_source_infos(sources)],
+                "session_id": session_id
+            })
+        except Exception as e:
+            logger.exception("Streaming query failed")
+            # Headers are already sent, so report the failure in-band
+            yield sse_event({"error": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/api/courses", response_model=CourseStats)
 async def get_course_stats():
     """Get course analytics and statistics"""
@@ -112,6 +189,12 @@ async def get_course_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/cache/clear")
+async def clear_response_cache():
+    """Clear all cached query responses"""
+    response_cache.clear()
+    return {"status": "cleared"}
+
 @app.get("/api/test-sources", response_model=QueryResponse)
 async def test_sources():
     """Test endpoint to verify SourceInfo serialization"""
@@ -137,14 +220,27 @@ async def test_sources():
 @app.on_event("startup")
 async def startup_event():
     """Load initial documents on startup"""
+    log_listener.start()
+    logger.addHandler(queue_handler)
+    logger.propagate = False
     docs_path = "../docs"
     if os.path.exists(docs_path):
-        print("Loading initial documents...")
+        logger.info("Loading initial documents...")
         try:
             courses, chunks = rag_system.add_course_folder(docs_path, clear_existing=False)
-            print(f"Loaded {courses} courses with {chunks} chunks")
+            logger.info("Loaded %d courses with %d chunks", courses, chunks)
+            # Course content may have changed, so cached answers are stale
+            response_cache.clear()
         except Exception as e:
-            print(f"Error loading documents: {e}")
+            logger.error("Error loading documents: %s", e)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled API connections and flush queued logs on shutdown"""
+    await rag_system.ai_generator.aclose()
+    logger.removeHandler(queue_handler)
+    logger.propagate = True
+    log_listener.stop()
 
 # Custom static file handler with no-cache headers for development
 from fastapi.staticfiles import StaticFiles
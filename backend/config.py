@@ -17,12 +17,19 @@ class Config:
 
     # Embedding model settings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    # Score searches on int8 embeddings (needs simsimd)
+    EMBEDDING_INT8_SEARCH: bool = False
 
     # Document processing settings
     CHUNK_SIZE: int = 800  # Size of text chunks for vector storage
     CHUNK_OVERLAP: int = 100  # Characters to overlap between chunks
     MAX_RESULTS: int = 0  # Maximum search results to return
     MAX_HISTORY: int = 2  # Number of conversation messages to remember
+
+    # Response cache settings
+    RESPONSE_CACHE_SIZE: int = 1024  # Maximum cached query responses
+    RESPONSE_CACHE_TTL: int = 3600  # Seconds before a cached response expires
+
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
 
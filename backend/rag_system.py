@@ -1,13 +1,13 @@
 
 
 
-from typing import List, Tuple, Optional, Dict, Any
+from typing import AsyncIterator, List, Tuple, Optional, Dict, Any
 import os
 from document_processor import DocumentProcessor
 from simple_vector_store import SimpleVectorStore as VectorStore
 from ai_generator import AIGenerator
 from session_manager import SessionManager
-from search_tools import ToolManager, CourseSearchTool, CourseOutlineTool
+from search_tools import ToolManager, ToolRun, CourseSearchTool, CourseOutlineTool
 from models import Course, Lesson, CourseChunk
 
 class RAGSystem:
@@ -18,7 +18,12 @@ class RAGSystem:
         
         # Initialize core components
         self.document_processor = DocumentProcessor(config.CHUNK_SIZE, config.CHUNK_OVERLAP)
-        self.vector_store = VectorStore(config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS)
+        self.vector_store = VectorStore(
+            config.CHROMA_PATH,
+            config.EMBEDDING_MODEL,
+            config.MAX_RESULTS,
+            config.EMBEDDING_INT8_SEARCH,
+        )
         self.ai_generator = AIGenerator(config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL)
         self.session_manager = SessionManager(config.MAX_HISTORY)
         
@@ -114,63 +119,148 @@ class RAGSystem:
             
         Returns:
             Tuple of (response, sources list - empty for tool-based approach)
+            
+        Raises:
+            GenerationError: No answer could be generated; the exchange is not recorded
         """
-        # Pre-process query to detect outline requests and force correct tool usage
-        outline_keywords = ['outline', 'lessons', 'structure', 'syllabus', 'lesson list', 'all lessons', 'what lessons', "what's in", "what's covered", "course content"]
-        query_lower = query.lower()
+        outline_response = self._answer_outline_query(query, session_id)
+        if outline_response is not None:
+            return outline_response, []
         
-        is_outline_query = any(keyword in query_lower for keyword in outline_keywords)
+        # For non-outline queries, use normal AI processing
+        prompt = f"""Answer this question about course materials: {query}"""
         
-        if is_outline_query:
-            # Force outline tool usage for outline queries
-            # Extract course name from query
-            course_name = "MCP"  # Default, could be made smarter
-            if "mcp" in query_lower:
-                course_name = "MCP"
-            elif "chroma" in query_lower:
-                course_name = "Chroma"
-            elif "anthropic" in query_lower:
-                course_name = "Anthropic"
-            elif "prompt" in query_lower:
-                course_name = "Prompt"
-            
-            # Directly use outline tool
-            outline_response = self.tool_manager.execute_tool('get_course_outline', course_name=course_name)
+        # Get conversation history if session exists
+        history = None
+        if session_id:
+            history = self.session_manager.get_conversation_history(session_id)
+        
+        # Generate response using AI with tools; sources are collected per query
+        tool_run = ToolRun(self.tool_manager)
+        response = self.ai_generator.generate_response(
+            query=prompt,
+            conversation_history=history,
+            tools=self.tool_manager.get_tool_definitions(),
+            tool_manager=tool_run
+        )
+        
+        return response, self._finish_query(query, session_id, response, tool_run.sources)
+    
+    async def aquery(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """
+        Async variant of query that awaits the AI generator instead of
+        blocking the event loop on Anthropic API calls.
+        
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
             
-            # Update conversation history
-            if session_id:
-                self.session_manager.add_exchange(session_id, query, outline_response)
+        Returns:
+            Tuple of (response, sources list)
             
+        Raises:
+            GenerationError: No answer could be generated; the exchange is not recorded
+        """
+        outline_response = self._answer_outline_query(query, session_id)
+        if outline_response is not None:
             return outline_response, []
         
-        # For non-outline queries, use normal AI processing
         prompt = f"""Answer this question about course materials: {query}"""
         
-        # Get conversation history if session exists
         history = None
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
         
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
+        tool_run = ToolRun(self.tool_manager)
+        response = await self.ai_generator.agenerate_response(
             query=prompt,
             conversation_history=history,
             tools=self.tool_manager.get_tool_definitions(),
-            tool_manager=self.tool_manager
+            tool_manager=tool_run
         )
         
-        # Get sources from the search tool
-        sources = self.tool_manager.get_last_sources()
-
-        # Reset sources after retrieving them
-        self.tool_manager.reset_sources()
+        return response, self._finish_query(query, session_id, response, tool_run.sources)
+    
+    async def astream_query(self, query: str, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of aquery.
+        
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+            
+        Yields:
+            {"delta": text} events while the answer is generated, then a
+            single {"sources": [...]} event once it is complete
+            
+        Raises:
+            GenerationError: No answer could be generated; the exchange is not recorded
+        """
+        outline_response = self._answer_outline_query(query, session_id)
+        if outline_response is not None:
+            yield {"delta": outline_response}
+            yield {"sources": []}
+            return
         
+        prompt = f"""Answer this question about course materials: {query}"""
+        
+        history = None
+        if session_id:
+            history = self.session_manager.get_conversation_history(session_id)
+        
+        parts = []
+        tool_run = ToolRun(self.tool_manager)
+        async for text in self.ai_generator.astream_response(
+            query=prompt,
+            conversation_history=history,
+            tools=self.tool_manager.get_tool_definitions(),
+            tool_manager=tool_run
+        ):
+            parts.append(text)
+            yield {"delta": text}
+        
+        yield {"sources": self._finish_query(query, session_id, "".join(parts), tool_run.sources)}
+    
+    def _answer_outline_query(self, query: str, session_id: Optional[str]) -> Optional[str]:
+        """Answer outline requests directly with the outline tool, or return None for other queries"""
+        # Pre-process query to detect outline requests and force correct tool usage
+        outline_keywords = ['outline', 'lessons', 'structure', 'syllabus', 'lesson list', 'all lessons', 'what lessons', "what's in", "what's covered", "course content"]
+        query_lower = query.lower()
+        
+        is_outline_query = any(keyword in query_lower for keyword in outline_keywords)
+        
+        if not is_outline_query:
+            return None
+        
+        # Force outline tool usage for outline queries
+        # Extract course name from query
+        course_name = "MCP"  # Default, could be made smarter
+        if "mcp" in query_lower:
+            course_name = "MCP"
+        elif "chroma" in query_lower:
+            course_name = "Chroma"
+        elif "anthropic" in query_lower:
+            course_name = "Anthropic"
+        elif "prompt" in query_lower:
+            course_name = "Prompt"
+        
+        # Directly use outline tool
+        outline_response = self.tool_manager.execute_tool('get_course_outline', course_name=course_name)
+        
+        # Update conversation history
+        if session_id:
+            self.session_manager.add_exchange(session_id, query, outline_response)
+        
+        return outline_response
+    
+    def _finish_query(self, query: str, session_id: Optional[str], response: str, sources: List[Any]) -> List[Any]:
+        """Record the exchange in the session and pass on the query's sources"""
         # Update conversation history
         if session_id:
             self.session_manager.add_exchange(session_id, query, response)
         
         # Return response with sources from tool searches
-        return response, sources
+        return sources
     
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
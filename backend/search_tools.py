@@ -1,4 +1,6 @@
-from typing import Dict, Any, Optional, Protocol
+import json
+import threading
+from typing import Dict, Any, List, Optional, Protocol, Tuple
 from abc import ABC, abstractmethod
 from simple_vector_store import SimpleVectorStore as VectorStore, SearchResults
 
@@ -15,6 +17,10 @@ class Tool(ABC):
     def execute(self, **kwargs) -> str:
         """Execute the tool with given parameters"""
         pass
+    
+    def run(self, **kwargs) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute the tool and also return the sources it used"""
+        return self.execute(**kwargs), []
 
 
 class CourseSearchTool(Tool):
@@ -61,17 +67,63 @@ class CourseSearchTool(Tool):
         Returns:
             Formatted search results or error message
         """
-        
+        result, self.last_sources = self.run(query, course_name, lesson_number)
+        return result
+    
+    def run(self, query: str, course_name: Optional[str] = None, lesson_number: Optional[int] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Search like execute, returning the sources instead of storing them in last_sources"""
         # Use the vector store's unified search interface
         results = self.store.search(
             query=query,
             course_name=course_name,
             lesson_number=lesson_number
         )
+        return self._render_results(results, course_name, lesson_number)
+    
+    def execute_batch(self, calls: List[Dict[str, Any]]) -> List[str]:
+        """
+        Execute several searches at once so their queries are embedded together.
+        
+        Args:
+            calls: Tool inputs, each with a query and optional course/lesson filters
+            
+        Returns:
+            Formatted results for each call, in order
+        """
+        outputs, call_sources = self.run_batch(calls)
+        # Sources from every search in the batch are shown together
+        self.last_sources = [source for sources in call_sources for source in sources]
+        return outputs
+    
+    def run_batch(self, calls: List[Dict[str, Any]]) -> Tuple[List[str], List[List[Dict[str, Any]]]]:
+        """Search like execute_batch, returning each call's sources instead of storing them in last_sources"""
+        batch_results = self.store.batch_search(
+            queries=[call["query"] for call in calls],
+            course_names=[call.get("course_name") for call in calls],
+            lesson_numbers=[call.get("lesson_number") for call in calls]
+        )
+        
+        # One lesson link lookup covers every search in the batch
+        links = self.store.get_lesson_links({
+            pair
+            for results in batch_results
+            if not results.error
+            for pair in self._lesson_pairs(results.metadata)
+        })
         
+        outputs = []
+        sources = []
+        for call, results in zip(calls, batch_results):
+            output, call_sources = self._render_results(results, call.get("course_name"), call.get("lesson_number"), links)
+            outputs.append(output)
+            sources.append(call_sources)
+        return outputs, sources
+    
+    def _render_results(self, results: SearchResults, course_name: Optional[str], lesson_number: Optional[int], links: Optional[Dict[Tuple[str, int], Optional[str]]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Turn search results into the tool's text output and its sources"""
         # Handle errors
         if results.error:
-            return results.error
+            return results.error, []
         
         # Handle empty results
         if results.is_empty():
@@ -80,46 +132,42 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"No relevant content found{filter_info}.", []
         
         # Format and return results
-        return self._format_results(results)
+        return self._format_results(results, links)
+    
+    @staticmethod
+    def _lesson_pairs(metadata: List[Dict[str, Any]]) -> set:
+        """(course title, lesson number) pairs of the results that have a lesson"""
+        return {
+            (meta.get('course_title', 'unknown'), meta['lesson_number'])
+            for meta in metadata
+            if meta.get('lesson_number') is not None
+        }
     
-    def _format_results(self, results: SearchResults) -> str:
-        """Format search results with course and lesson context"""
-        formatted = []
-        sources = []  # Track structured sources for the UI
+    def _format_results(self, results: SearchResults, links: Optional[Dict[Tuple[str, int], Optional[str]]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Format search results with course and lesson context; returns the text and its sources"""
+        # Read the metadata into parallel columns once
+        titles = [meta.get('course_title', 'unknown') for meta in results.metadata]
+        lessons = [meta.get('lesson_number') for meta in results.metadata]
         
-        for doc, meta in zip(results.documents, results.metadata):
-            course_title = meta.get('course_title', 'unknown')
-            lesson_num = meta.get('lesson_number')
-            
-            # Build context header
-            header = f"[{course_title}"
-            if lesson_num is not None:
-                header += f" - Lesson {lesson_num}"
-            header += "]"
-            
-            # Create structured source with lesson link if available
-            source = {
-                'title': course_title,
-                'lesson_number': lesson_num,
-                'link': None
-            }
-            
-            # Try to get lesson link from vector store
-            if lesson_num is not None:
-                link = self.store.get_lesson_link(course_title, lesson_num)
-                if link:
-                    source['link'] = link
-            
-            sources.append(source)
-            formatted.append(f"{header}\n{doc}")
+        # Look up lesson links for the whole result set in one call
+        if links is None:
+            links = self.store.get_lesson_links(self._lesson_pairs(results.metadata))
         
-        # Store structured sources for retrieval
-        self.last_sources = sources
+        # Structured sources, with lesson links where available, for the UI
+        sources = [
+            {'title': title, 'lesson_number': lesson, 'link': links.get((title, lesson))}
+            for title, lesson in zip(titles, lessons)
+        ]
         
-        return "\n\n".join(formatted)
+        # Context header and document for each result
+        text = "\n\n".join(
+            f"[{title} - Lesson {lesson}]\n{doc}" if lesson is not None else f"[{title}]\n{doc}"
+            for title, lesson, doc in zip(titles, lessons, results.documents)
+        )
+        return text, sources
 
 class CourseOutlineTool(Tool):
     """Tool for getting course outline with lesson structure"""
@@ -196,8 +244,12 @@ class CourseOutlineTool(Tool):
 class ToolManager:
     """Manages available tools for the AI"""
     
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 4):
         self.tools = {}
+        self.max_concurrency = max_concurrency  # Max tool calls executed in parallel per round
+        self._source_tools: Dict[str, Tool] = {}  # Tools that track sources, by name
+        self._last_source_tool: Optional[Tool] = None  # Source-tracking tool executed most recently
+        self._defs_cache: Optional[list] = None  # Tool definitions, rebuilt after registration
     
     def register_tool(self, tool: Tool):
         """Register any tool that implements the Tool interface"""
@@ -206,29 +258,139 @@ class ToolManager:
         if not tool_name:
             raise ValueError("Tool must have a 'name' in its definition")
         self.tools[tool_name] = tool
-
+        if hasattr(tool, 'last_sources'):
+            self._source_tools[tool_name] = tool
+        self._defs_cache = None
     
     def get_tool_definitions(self) -> list:
         """Get all tool definitions for Anthropic tool calling"""
-        return [tool.get_tool_definition() for tool in self.tools.values()]
+        if self._defs_cache is None:
+            self._defs_cache = [tool.get_tool_definition() for tool in self.tools.values()]
+        return self._defs_cache
     
     def execute_tool(self, tool_name: str, **kwargs) -> str:
         """Execute a tool by name with given parameters"""
         if tool_name not in self.tools:
             return f"Tool '{tool_name}' not found"
         
-        return self.tools[tool_name].execute(**kwargs)
+        result = self.tools[tool_name].execute(**kwargs)
+        if tool_name in self._source_tools:
+            self._last_source_tool = self._source_tools[tool_name]
+        return result
+    
+    def run_tool(self, tool_name: str, **kwargs) -> Tuple[str, List[Dict[str, Any]]]:
+        """Execute a tool by name, returning its result and sources without tracking them"""
+        if tool_name not in self.tools:
+            return f"Tool '{tool_name}' not found", []
+        return self.tools[tool_name].run(**kwargs)
+    
+    def _batches(self, calls: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, List[int]]:
+        """Call indices for each batch-capable tool called more than once"""
+        indices_by_tool: Dict[str, List[int]] = {}
+        for i, (tool_name, _) in enumerate(calls):
+            if hasattr(self.tools.get(tool_name), "execute_batch"):
+                indices_by_tool.setdefault(tool_name, []).append(i)
+        # A single call gains nothing from batching
+        return {tool_name: indices for tool_name, indices in indices_by_tool.items() if len(indices) > 1}
+    
+    def execute_batched(self, calls: List[Tuple[str, Dict[str, Any]]]) -> Dict[int, str]:
+        """Run repeated calls to batch-capable tools together; returns results by call index"""
+        results = {}
+        for tool_name, indices in self._batches(calls).items():
+            tool = self.tools[tool_name]
+            outputs = tool.execute_batch([calls[i][1] for i in indices])
+            results.update(zip(indices, outputs))
+            if tool_name in self._source_tools:
+                self._last_source_tool = tool
+        return results
+    
+    def run_batched(self, calls: List[Tuple[str, Dict[str, Any]]]) -> Tuple[Dict[int, str], Dict[int, List[Dict[str, Any]]]]:
+        """Like execute_batched, also returning each call's sources by call index instead of tracking them"""
+        results = {}
+        sources = {}
+        for tool_name, indices in self._batches(calls).items():
+            outputs, call_sources = self.tools[tool_name].run_batch([calls[i][1] for i in indices])
+            results.update(zip(indices, outputs))
+            sources.update(zip(indices, call_sources))
+        return results, sources
     
     def get_last_sources(self) -> list:
         """Get sources from the last search operation"""
-        # Check all tools for last_sources attribute
-        for tool in self.tools.values():
-            if hasattr(tool, 'last_sources') and tool.last_sources:
-                return tool.last_sources
+        tool = self._last_source_tool
+        if tool is not None and tool.last_sources:
+            return tool.last_sources
         return []
 
     def reset_sources(self):
         """Reset sources from all tools that track sources"""
-        for tool in self.tools.values():
-            if hasattr(tool, 'last_sources'):
-                tool.last_sources = []
\ No newline at end of file
+        for tool in self._source_tools.values():
+            tool.last_sources = []
+        self._last_source_tool = None
+
+
+class ToolRun:
+    """
+    The tool calls made while answering one query, and the sources they found.
+    
+    Handed to the AI generator in place of the ToolManager, so concurrent
+    queries each collect their own sources rather than reading whichever
+    tool ran last.
+    
+    The generator passes each round's calls to execute_batched before running
+    the rest one by one, possibly on several threads. That numbers the round's
+    calls, so sources come back in call order however the threads finish.
+    """
+    
+    def __init__(self, manager: ToolManager):
+        self.manager = manager
+        self.max_concurrency = manager.max_concurrency
+        self._round = 0
+        self._positions: Dict[Tuple[str, str], int] = {}  # Call key -> position in the current round
+        self._sources_by_call: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}  # By (round, position)
+        self._lock = threading.Lock()  # Calls in one round run on several threads
+    
+    @property
+    def sources(self) -> List[Dict[str, Any]]:
+        """Sources of every call so far, in call order, each source listed once"""
+        with self._lock:
+            by_call = [self._sources_by_call[key] for key in sorted(self._sources_by_call)]
+        unique = {}
+        for call_sources in by_call:
+            for source in call_sources:
+                key = (source.get('title'), source.get('lesson_number'), source.get('link'))
+                unique.setdefault(key, source)
+        return list(unique.values())
+    
+    @staticmethod
+    def _call_key(tool_name: str, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        """Identify a call by its tool and input"""
+        return tool_name, json.dumps(kwargs, sort_keys=True)
+    
+    def execute_tool(self, tool_name: str, **kwargs) -> str:
+        """Execute a tool by name, keeping its sources for this query"""
+        with self._lock:
+            # Calls not announced by execute_batched go after the round's known calls
+            position = self._positions.setdefault(self._call_key(tool_name, kwargs), len(self._positions))
+        result, sources = self.manager.run_tool(tool_name, **kwargs)
+        self._add_sources(position, sources)
+        return result
+    
+    def execute_batched(self, calls: List[Tuple[str, Dict[str, Any]]]) -> Dict[int, str]:
+        """Start a round of calls, running repeated calls to batch-capable tools together
+        and keeping their sources for this query"""
+        with self._lock:
+            if self._positions:
+                self._round += 1
+            self._positions = {}
+            for tool_name, kwargs in calls:
+                self._positions.setdefault(self._call_key(tool_name, kwargs), len(self._positions))
+        results, sources = self.manager.run_batched(calls)
+        for i, call_sources in sources.items():
+            self._add_sources(self._positions[self._call_key(*calls[i])], call_sources)
+        return results
+    
+    def _add_sources(self, position: int, sources: List[Dict[str, Any]]):
+        """Record the sources found by the call at position in the current round"""
+        if sources:
+            with self._lock:
+                self._sources_by_call[(self._round, position)] = sources
@@ -1,11 +1,116 @@
+import contextlib
+import functools
+import importlib.util
+import io
 import json
 import os
-from dataclasses import asdict, dataclass
-from typing import Any, Dict, List, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import numpy as np
 from models import Course, CourseChunk
 from sentence_transformers import SentenceTransformer
+from sentence_transformers.models import Normalize, Pooling, Transformer
+
+try:
+    import simsimd
+except ImportError:  # Optional SIMD distance kernels; NumPy matmul is the fallback
+    simsimd = None
+
+try:
+    import orjson
+except ImportError:  # Optional faster JSON codec; the json module is the fallback
+    orjson = None
+
+# Chunks per forward pass when encoding documents
+ENCODE_BATCH_SIZE = 64
+
+# Recent query embeddings kept to skip re-encoding repeated queries
+QUERY_CACHE_SIZE = 1024
+
+# Below this many rows a single scoring call beats splitting work across threads
+PARALLEL_SEARCH_MIN_ROWS = 1000
+
+_NO_ROWS = np.zeros(0, dtype=np.intp)
+
+
+def _json_bytes(obj: Any) -> bytes:
+    """Serialize obj as compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    """Parse UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _configure_threads():
+    """Let encoding use every core, or RAG_TORCH_THREADS if it is set"""
+    import torch
+
+    threads = int(os.environ.get("RAG_TORCH_THREADS", os.cpu_count() or 1))
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Only settable once per process, before any inter-op work
+
+
+def _half_precision() -> bool:
+    """Whether RAG_FP16=1 asks for half-precision encoding"""
+    return os.environ.get("RAG_FP16") == "1"
+
+
+def _encode_precision():
+    """Run CPU encoding under bfloat16 autocast when half precision is on"""
+    import torch
+
+    if _half_precision() and not torch.cuda.is_available():
+        return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+@functools.lru_cache(maxsize=4)
+def _get_model(model_name: str) -> SentenceTransformer:
+    """Load a model once per process, on ONNX Runtime when it is installed"""
+    import torch
+
+    print(f"Loading embedding model: {model_name}")
+    _configure_threads()
+    if importlib.util.find_spec("onnxruntime") is not None:
+        try:
+            # Uses the model's published ONNX weights, exporting them if absent
+            return SentenceTransformer(model_name, backend="onnx")
+        except Exception as e:
+            print(f"ONNX backend unavailable, using PyTorch: {e}")
+    model = SentenceTransformer(model_name)
+    if _half_precision() and torch.cuda.is_available():
+        model.half()  # Weights stored and run in fp16 on the GPU
+    return model
+
+
+@functools.lru_cache(maxsize=4)
+def _query_transformer(model_name: str) -> Optional[Transformer]:
+    """The transformer module of a mean-pooled PyTorch model, or None otherwise"""
+    model = _get_model(model_name)
+    modules = list(model)
+    if (
+        getattr(model, "backend", "torch") != "torch"
+        or len(modules) < 2
+        or not isinstance(modules[0], Transformer)
+        or not isinstance(modules[1], Pooling)
+        or modules[1].get_pooling_mode_str() != "mean"
+        or not all(isinstance(module, Normalize) for module in modules[2:])
+    ):
+        return None
+    return modules[0]
 
 
 @dataclass
@@ -27,56 +132,61 @@ class SearchResults:
         return len(self.documents) == 0
 
 
-@dataclass
-class StoredChunk:
-    """Stored chunk with embedding"""
-
-    content: str
-    metadata: Dict[str, Any]
-    embedding: List[float]
-    chunk_id: str
-
-
 class SimpleVectorStore:
     """Simple in-memory vector store using sentence-transformers and cosine similarity"""
 
-    def __init__(self, storage_path: str, embedding_model: str, max_results: int = 5):
+    def __init__(
+        self,
+        storage_path: str,
+        embedding_model: str,
+        max_results: int = 5,
+        int8_search: bool = False,
+    ):
         self.storage_path = storage_path
         self.max_results = max_results
+        self.int8_search = int8_search  # Only takes effect when simsimd is installed
 
-        print(f"Loading embedding model: {embedding_model}")
-        self.embedding_model = SentenceTransformer(embedding_model)
+        self.embedding_model_name = embedding_model  # Loaded on first encode
 
-        # In-memory storage
-        self.course_chunks: List[StoredChunk] = []
+        # In-memory storage, column per field: row i of every column is chunk i
+        self._contents: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._ids: List[str] = []
         self.course_metadata: Dict[str, Dict] = {}
 
+        # L2-normalized float32 embeddings, one row per chunk, for matmul search
+        self._emb_matrix: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self._emb_int8: Optional[np.ndarray] = None  # Quantized copy, built on demand
+
+        # Filter columns: row indices per lower-cased course title, the rows
+        # matched by each course filter term seen so far, and each chunk's
+        # lesson number (-1 when it has none)
+        self._course_rows: Dict[str, np.ndarray] = {}
+        self._course_term_rows: Dict[str, np.ndarray] = {}
+        self._lesson_numbers: np.ndarray = np.zeros(0, dtype=np.int32)
+
+        # LRU of query string -> unit embedding; searches may run on several threads
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+
+        # Workers for scoring large matrices; BLAS and simsimd release the GIL
+        self._search_workers = os.cpu_count() or 1
+        self._search_pool = ThreadPoolExecutor(max_workers=self._search_workers)
+
         # Create storage directory
         os.makedirs(storage_path, exist_ok=True)
 
         # Try to load existing data
         self._load_data()
 
-    def _save_data(self):
-        """Save data to disk"""
-        try:
-            # Save chunks
-            chunks_data = []
-            for chunk in self.course_chunks:
-                chunks_data.append(
-                    {
-                        "content": chunk.content,
-                        "metadata": chunk.metadata,
-                        "embedding": chunk.embedding,
-                        "chunk_id": chunk.chunk_id,
-                    }
-                )
+    @property
+    def embedding_model(self) -> SentenceTransformer:
+        """The embedding model, shared by every store that uses the same one"""
+        return _get_model(self.embedding_model_name)
 
-            chunks_file = os.path.join(self.storage_path, "chunks.json")
-            with open(chunks_file, "w", encoding="utf-8") as f:
-                json.dump(chunks_data, f, ensure_ascii=False, indent=2)
-
-            # Save course metadata
+    def _save_course_metadata(self):
+        """Save course metadata to disk"""
+        try:
             metadata_file = os.path.join(self.storage_path, "courses.json")
             with open(metadata_file, "w", encoding="utf-8") as f:
                 json.dump(self.course_metadata, f, ensure_ascii=False, indent=2)
@@ -84,23 +194,161 @@ class SimpleVectorStore:
         except Exception as e:
             print(f"Error saving data: {e}")
 
+    def _append_chunks(self, start: int) -> bool:
+        """Append chunks from index start onwards to the files on disk.
+
+        Appends only when both files hold exactly the first start chunks and
+        the .npy header keeps its size; otherwise both files are rewritten
+        from memory. A failed append cuts both files back to their old length,
+        so they always hold the same number of rows.
+
+        Returns:
+            Whether every chunk in memory is now on disk
+        """
+        try:
+            if start == 0 or not self._try_append(start):
+                self._write_embeddings()
+                chunks_file = os.path.join(self.storage_path, "chunks.jsonl")
+                tmp_file = os.path.join(self.storage_path, "chunks.tmp.jsonl")
+                with open(tmp_file, "wb") as f:
+                    f.write(self._chunk_records(0))
+                os.replace(tmp_file, chunks_file)
+            return True
+
+        except OSError as e:
+            print(f"Error saving data: {e}")
+            return False
+
+    def _chunk_records(self, start: int) -> bytes:
+        """Chunks from index start onwards as JSON lines of text and metadata"""
+        return b"".join(
+            _json_bytes(
+                {
+                    "content": self._contents[i],
+                    "metadata": self._metas[i],
+                    "chunk_id": self._ids[i],
+                }
+            )
+            + b"\n"
+            for i in range(start, len(self._contents))
+        )
+
+    def _try_append(self, start: int) -> bool:
+        """Append chunks from index start onwards in place, if the files allow it.
+
+        Returns:
+            False, having written nothing, if the files do not hold exactly
+            start chunks or the .npy header would change size
+        """
+        chunks_file = os.path.join(self.storage_path, "chunks.jsonl")
+        embeddings_file = os.path.join(self.storage_path, "embeddings.npy")
+        if not (os.path.exists(embeddings_file) and os.path.exists(chunks_file)):
+            return False
+
+        with (
+            open(embeddings_file, "r+b") as emb,
+            open(chunks_file, "r+b") as chunks,
+        ):
+            try:
+                version = np.lib.format.read_magic(emb)
+                if version != (1, 0):
+                    return False
+                np.lib.format.read_array_header_1_0(emb)
+            except ValueError:  # Not a readable .npy file
+                return False
+            data_offset = emb.tell()
+
+            # Build the new header before touching the file. numpy pads .npy
+            # headers so the first axis can grow without the header changing
+            # length; anything else needs a full rewrite
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(
+                header,
+                {
+                    "descr": np.lib.format.dtype_to_descr(self._emb_matrix.dtype),
+                    "fortran_order": False,
+                    "shape": self._emb_matrix.shape,
+                },
+            )
+            if header.tell() != data_offset:
+                return False
+
+            # A failed earlier save leaves memory ahead of disk
+            row_nbytes = self._emb_matrix.shape[1] * self._emb_matrix.itemsize
+            emb_end = emb.seek(0, os.SEEK_END)
+            if emb_end - data_offset != start * row_nbytes:
+                return False
+            chunks.seek(0)
+            line_count = sum(
+                block.count(b"\n") for block in iter(lambda: chunks.read(1 << 20), b"")
+            )
+            if line_count != start:
+                return False
+            chunks_end = chunks.tell()
+
+            try:
+                # Rows first; the header's row count is bumped last
+                emb.write(np.ascontiguousarray(self._emb_matrix[start:]).tobytes())
+                chunks.write(self._chunk_records(start))
+                emb.seek(0)
+                emb.write(header.getvalue())
+            except OSError:
+                emb.truncate(emb_end)
+                chunks.truncate(chunks_end)
+                raise
+        return True
+
+    def _write_embeddings(self):
+        """Write the whole embedding matrix to disk"""
+        # The loaded matrix may be memory-mapped from embeddings.npy, so write a
+        # new file and swap it in rather than truncating in place
+        embeddings_file = os.path.join(self.storage_path, "embeddings.npy")
+        tmp_file = os.path.join(self.storage_path, "embeddings.tmp.npy")
+        np.save(tmp_file, self._emb_matrix)
+        os.replace(tmp_file, embeddings_file)
+
     def _load_data(self):
         """Load data from disk"""
         try:
             # Load chunks
-            chunks_file = os.path.join(self.storage_path, "chunks.json")
-            if os.path.exists(chunks_file):
-                with open(chunks_file, "r", encoding="utf-8") as f:
-                    chunks_data = json.load(f)
-
-                for chunk_data in chunks_data:
-                    chunk = StoredChunk(
-                        content=chunk_data["content"],
-                        metadata=chunk_data["metadata"],
-                        embedding=chunk_data["embedding"],
-                        chunk_id=chunk_data["chunk_id"],
+            chunks_file = os.path.join(self.storage_path, "chunks.jsonl")
+            embeddings_file = os.path.join(self.storage_path, "embeddings.npy")
+            legacy_file = os.path.join(self.storage_path, "chunks.json")
+            if os.path.exists(chunks_file) and os.path.exists(embeddings_file):
+                with open(chunks_file, "rb") as f:
+                    records = [_json_loads(line) for line in f if line.strip()]
+                # Memory-map the matrix so startup does not read it all up front
+                emb_matrix = np.load(embeddings_file, mmap_mode="r")
+                if len(records) != emb_matrix.shape[0]:
+                    raise ValueError(
+                        f"chunks.jsonl has {len(records)} records but "
+                        f"embeddings.npy has {emb_matrix.shape[0]} rows"
                     )
-                    self.course_chunks.append(chunk)
+
+                self._contents = [record["content"] for record in records]
+                self._metas = [record["metadata"] for record in records]
+                self._ids = [record["chunk_id"] for record in records]
+                self._emb_matrix = emb_matrix
+
+            elif os.path.exists(legacy_file):
+                # Older stores kept each embedding as a JSON list next to its chunk
+                with open(legacy_file, "rb") as f:
+                    chunks_data = _json_loads(f.read())
+
+                self._contents = [chunk["content"] for chunk in chunks_data]
+                self._metas = [chunk["metadata"] for chunk in chunks_data]
+                self._ids = [chunk["chunk_id"] for chunk in chunks_data]
+                if chunks_data:
+                    self._emb_matrix = self._normalize(
+                        np.array(
+                            [chunk["embedding"] for chunk in chunks_data],
+                            dtype=np.float32,
+                        )
+                    )
+                    # Convert to the current layout once
+                    self._append_chunks(0)
+
+            self._index_metadata(self._metas)
 
             # Load course metadata
             metadata_file = os.path.join(self.storage_path, "courses.json")
@@ -109,29 +357,20 @@ class SimpleVectorStore:
                     self.course_metadata = json.load(f)
 
             print(
-                f"Loaded {len(self.course_chunks)} chunks and {len(self.course_metadata)} courses"
+                f"Loaded {len(self._contents)} chunks and {len(self.course_metadata)} courses"
             )
 
-        except Exception as e:
+        except (OSError, ValueError) as e:  # Unreadable or corrupt files
             print(f"Error loading data: {e}")
 
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        try:
-            vec1_np = np.array(vec1)
-            vec2_np = np.array(vec2)
-
-            dot_product = np.dot(vec1_np, vec2_np)
-            norm_vec1 = np.linalg.norm(vec1_np)
-            norm_vec2 = np.linalg.norm(vec2_np)
-
-            if norm_vec1 == 0 or norm_vec2 == 0:
-                return 0.0
-
-            similarity = dot_product / (norm_vec1 * norm_vec2)
-            return float(similarity)
-        except:
-            return 0.0
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        """Return embeddings as float32 rows scaled to unit length (for legacy data)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        # Row-wise dot products, then one sqrt; cheaper than np.linalg.norm
+        norms = np.sqrt(np.einsum("ij,ij->i", embeddings, embeddings))[:, None]
+        norms[norms == 0] = 1.0  # Leave zero vectors as they are
+        return embeddings / norms
 
     def search(
         self,
@@ -141,54 +380,216 @@ class SimpleVectorStore:
         limit: Optional[int] = None,
     ) -> SearchResults:
         """Search course content"""
-        try:
-            if not self.course_chunks:
-                return SearchResults.empty("No content available")
-
-            # Encode query
-            query_embedding = self.embedding_model.encode([query])[0].tolist()
-
-            # Calculate similarities and filter
-            candidates = []
-            for chunk in self.course_chunks:
-                # Apply filters
-                if (
-                    course_name
-                    and course_name.lower()
-                    not in chunk.metadata.get("course_title", "").lower()
-                ):
-                    continue
-                if (
-                    lesson_number
-                    and chunk.metadata.get("lesson_number") != lesson_number
-                ):
-                    continue
-
-                # Calculate similarity
-                similarity = self._cosine_similarity(query_embedding, chunk.embedding)
-                candidates.append((chunk, similarity))
-
-            # Sort by similarity (descending) and take top results
-            candidates.sort(key=lambda x: x[1], reverse=True)
-            top_candidates = candidates[: limit or self.max_results]
-
-            # Prepare results
-            documents = [chunk.content for chunk, _ in top_candidates]
-            metadata = [chunk.metadata for chunk, _ in top_candidates]
-            distances = [
-                1.0 - similarity for _, similarity in top_candidates
-            ]  # Convert to distance
-
-            return SearchResults(
-                documents=documents, metadata=metadata, distances=distances
+        return self.batch_search([query], [course_name], [lesson_number], limit)[0]
+
+    def batch_search(
+        self,
+        queries: List[str],
+        course_names: Optional[List[Optional[str]]] = None,
+        lesson_numbers: Optional[List[Optional[int]]] = None,
+        limit: Optional[int] = None,
+    ) -> List[SearchResults]:
+        """Search several queries at once, embedding them in a single model call"""
+        course_names = course_names or [None] * len(queries)
+        lesson_numbers = lesson_numbers or [None] * len(queries)
+        if not self._contents:
+            return [SearchResults.empty("No content available") for _ in queries]
+
+        query_embeddings = self._encode_queries(queries)
+
+        return [
+            self._rank_chunks(embedding, course_name, lesson_number, limit)
+            for embedding, course_name, lesson_number in zip(
+                query_embeddings, course_names, lesson_numbers
+            )
+        ]
+
+    @staticmethod
+    def _quantize(embeddings: np.ndarray) -> np.ndarray:
+        """Scale each vector into int8 range; cosine ignores the per-vector scale"""
+        scale = np.abs(embeddings).max(axis=-1, keepdims=True)
+        scale[scale == 0] = 1.0
+        return np.round(embeddings / scale * 127).astype(np.int8)
+
+    def _similarities(
+        self, query_embedding: np.ndarray, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Cosine similarity of the query to every stored chunk, or just to `rows`"""
+        if simsimd is not None and self.int8_search:
+            # A quarter of the bytes per row to stream through the int8 kernel
+            if self._emb_int8 is None:
+                self._emb_int8 = self._quantize(self._emb_matrix)
+            matrix, query = self._emb_int8, self._quantize(query_embedding)
+        else:
+            matrix, query = self._emb_matrix, query_embedding
+        if rows is not None:
+            matrix = matrix[rows]
+
+        if len(matrix) < PARALLEL_SEARCH_MIN_ROWS or self._search_workers < 2:
+            return self._score_rows(matrix, query)
+
+        # Score row slices on all cores, then stitch them back in order
+        bounds = np.linspace(0, len(matrix), self._search_workers + 1, dtype=int)
+        parts = self._search_pool.map(
+            lambda start, end: self._score_rows(matrix[start:end], query),
+            bounds[:-1],
+            bounds[1:],
+        )
+        return np.concatenate(list(parts))
+
+    @staticmethod
+    def _score_rows(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query to each row of a unit-norm matrix"""
+        if simsimd is not None:
+            distances = simsimd.cdist(query[None, :], matrix, metric="cosine")
+            return 1.0 - np.asarray(distances)[0]
+
+        # Rows and query are unit length, so one matmul gives every cosine similarity
+        return matrix @ query
+
+    def _index_metadata(self, metas: List[Dict[str, Any]]):
+        """Append filter columns for newly stored chunks"""
+        start = len(self._lesson_numbers)
+        new_rows: Dict[str, List[int]] = {}
+        for row, meta in enumerate(metas, start):
+            new_rows.setdefault(meta.get("course_title", "").lower(), []).append(row)
+        for title, rows in new_rows.items():
+            self._course_rows[title] = np.concatenate(
+                [self._course_rows.get(title, _NO_ROWS), np.array(rows, dtype=np.intp)]
             )
+        self._course_term_rows.clear()
+
+        lesson_numbers = [
+            -1 if meta.get("lesson_number") is None else meta["lesson_number"]
+            for meta in metas
+        ]
+        self._lesson_numbers = np.concatenate(
+            [self._lesson_numbers, np.array(lesson_numbers, dtype=np.int32)]
+        )
+
+    def _candidate_indices(
+        self, course_name: Optional[str], lesson_number: Optional[int]
+    ) -> np.ndarray:
+        """Indices of stored chunks that pass the course and lesson filters"""
+        if course_name:
+            # Substring-match each distinct course once per term, then reuse
+            term = course_name.lower()
+            candidates = self._course_term_rows.get(term)
+            if candidates is None:
+                matching = [
+                    rows for title, rows in self._course_rows.items() if term in title
+                ]
+                candidates = np.sort(np.concatenate(matching)) if matching else _NO_ROWS
+                self._course_term_rows[term] = candidates
+        else:
+            candidates = np.arange(len(self._metas))
+
+        if lesson_number is not None:
+            candidates = candidates[self._lesson_numbers[candidates] == lesson_number]
+        return candidates
+
+    def _encode_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Unit embeddings for queries, encoding only those not seen recently"""
+        embeddings: Dict[str, Optional[np.ndarray]] = {}
+        with self._query_cache_lock:
+            for query in queries:
+                embeddings[query] = self._query_cache.get(query)
+                if embeddings[query] is not None:
+                    self._query_cache.move_to_end(query)
+
+        # Encode all misses in one forward pass
+        misses = [query for query, embedding in embeddings.items() if embedding is None]
+        if misses:
+            encoded = None
+            if len(misses) == 1:
+                encoded = self._encode_query_fast(misses[0])
+            if encoded is None:
+                encoded = self._encode(misses, batch_size=32)
+            with self._query_cache_lock:
+                for query, embedding in zip(misses, encoded):
+                    embedding.flags.writeable = False  # Shared between searches
+                    embeddings[query] = embedding
+                    self._query_cache[query] = embedding
+                while len(self._query_cache) > QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
+
+        return [embeddings[query] for query in queries]
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Encode texts as float32 unit vectors"""
+        half = _half_precision()
+        with _encode_precision():
+            embeddings = self.embedding_model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=not half,
+                show_progress_bar=False,
+            )
+        if half:
+            # Normalize in float32 so half-precision rounding stays out of the norms
+            return self._normalize(embeddings)
+        return embeddings.astype(np.float32, copy=False)
+
+    def _encode_query_fast(self, query: str) -> Optional[List[np.ndarray]]:
+        """Encode one query straight through the transformer, skipping encode()'s
+        batching and conversion overhead; None if the model does not support it"""
+        transformer = _query_transformer(self.embedding_model_name)
+        if transformer is None:
+            return None
 
-        except Exception as e:
-            print(f"Search error: {e}")
-            return SearchResults.empty(f"Search failed: {str(e)}")
+        import torch
+
+        device = self.embedding_model.device
+        # Tokenize as encode() does, stripping and lower-casing per the model
+        features = transformer.tokenize([query])
+        features = {name: tensor.to(device) for name, tensor in features.items()}
+        with torch.inference_mode(), _encode_precision():
+            hidden = transformer(features)["token_embeddings"]
+
+        # A single unpadded sequence, so mean pooling is a plain mean over tokens
+        embedding = torch.nn.functional.normalize(hidden.float().mean(dim=1), dim=1)
+        return list(embedding.cpu().numpy())
+
+    def _rank_chunks(
+        self,
+        query_embedding: np.ndarray,
+        course_name: Optional[str],
+        lesson_number: Optional[int],
+        limit: Optional[int],
+    ) -> SearchResults:
+        """Score stored chunks against one query embedding and keep the top results"""
+        # Apply filters
+        candidates = self._candidate_indices(course_name, lesson_number)
+        k = min(limit or self.max_results, len(candidates))
+        if k <= 0:
+            return SearchResults(documents=[], metadata=[], distances=[])
+
+        # Score only the chunks that passed the filters
+        if len(candidates) < len(self._metas):
+            candidate_sims = self._similarities(query_embedding, candidates)
+        else:
+            candidate_sims = self._similarities(query_embedding)
+
+        # Take the top results, sorting only those
+        if k < len(candidates):
+            top = np.argpartition(-candidate_sims, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-candidate_sims[top], kind="stable")]
+
+        # Prepare results
+        top_indices = candidates[top]
+        documents = [self._contents[i] for i in top_indices]
+        metadata = [self._metas[i] for i in top_indices]
+        distances = (1.0 - candidate_sims[top]).tolist()  # Convert to distance
+
+        return SearchResults(
+            documents=documents, metadata=metadata, distances=distances
+        )
 
     def add_course_metadata(self, course: Course):
-        """Add course metadata"""
+        """Add course metadata, saved to disk once the course's content is"""
         try:
             self.course_metadata[course.title] = {
                 "course_title": course.title,
@@ -204,43 +605,58 @@ class SimpleVectorStore:
                     for lesson in course.lessons
                 ],
             }
-            self._save_data()
             print(f"Added course metadata: {course.title}")
 
         except Exception as e:
             print(f"Error adding course metadata: {e}")
 
     def add_course_content(self, course_chunks: List[CourseChunk]):
-        """Add course content chunks"""
-        try:
-            if not course_chunks:
-                return
-
-            print(f"Encoding {len(course_chunks)} chunks...")
-
-            # Encode all documents
-            documents = [chunk.content for chunk in course_chunks]
-            embeddings = self.embedding_model.encode(documents)
-
-            # Add to storage
-            for i, chunk in enumerate(course_chunks):
-                stored_chunk = StoredChunk(
-                    content=chunk.content,
-                    metadata={
-                        "course_title": chunk.course_title,
-                        "chunk_index": chunk.chunk_index,
-                        "lesson_number": chunk.lesson_number,
-                    },
-                    embedding=embeddings[i].tolist(),
-                    chunk_id=f"chunk_{chunk.course_title}_{chunk.chunk_index}",
-                )
-                self.course_chunks.append(stored_chunk)
-
-            self._save_data()
-            print(f"Added {len(course_chunks)} content chunks")
-
-        except Exception as e:
-            print(f"Error adding course content: {e}")
+        """Add course content chunks, then save course metadata to disk.
+
+        Metadata is only saved once the content is, so a course whose chunks
+        failed to save is not listed as existing after a restart
+        """
+        if not course_chunks:
+            self._save_course_metadata()
+            return
+
+        print(f"Encoding {len(course_chunks)} chunks...")
+
+        # Encode all documents in one call as unit vectors, so search is a pure
+        # dot product. encode() sorts the whole list by length before batching
+        # (and restores the order), so each batch pads to similar lengths
+        documents = [chunk.content for chunk in course_chunks]
+        new_rows = self._encode(documents, batch_size=ENCODE_BATCH_SIZE)
+
+        start = len(self._contents)
+
+        # Extend the search matrix with the new rows
+        if self._emb_matrix.size:
+            self._emb_matrix = np.vstack([self._emb_matrix, new_rows])
+        else:
+            self._emb_matrix = new_rows
+        self._emb_int8 = None
+
+        # Add to storage
+        new_metas = [
+            {
+                "course_title": chunk.course_title,
+                "chunk_index": chunk.chunk_index,
+                "lesson_number": chunk.lesson_number,
+            }
+            for chunk in course_chunks
+        ]
+        self._contents.extend(chunk.content for chunk in course_chunks)
+        self._metas.extend(new_metas)
+        self._ids.extend(
+            f"chunk_{chunk.course_title}_{chunk.chunk_index}" for chunk in course_chunks
+        )
+        self._index_metadata(new_metas)
+
+        # Only the new chunks are written; existing data is left in place
+        if self._append_chunks(start):
+            self._save_course_metadata()
+        print(f"Added {len(course_chunks)} content chunks")
 
     def get_course_count(self) -> int:
         """Get total number of courses"""
@@ -252,57 +668,78 @@ class SimpleVectorStore:
 
     def get_lesson_link(self, course_title: str, lesson_number: int) -> Optional[str]:
         """Get lesson link for a specific course and lesson number"""
-        try:
-            course_meta = self.course_metadata.get(course_title)
-            if not course_meta or "lessons" not in course_meta:
-                return None
-
-            for lesson in course_meta["lessons"]:
-                if lesson.get("lesson_number") == lesson_number:
-                    return lesson.get("lesson_link")
-
-            return None
-        except Exception as e:
-            print(f"Error getting lesson link: {e}")
+        course_meta = self.course_metadata.get(course_title)
+        if not course_meta or "lessons" not in course_meta:
             return None
 
+        for lesson in course_meta["lessons"]:
+            if lesson.get("lesson_number") == lesson_number:
+                return lesson.get("lesson_link")
+
+        return None
+
+    def get_lesson_links(
+        self, pairs: Iterable[Tuple[str, int]]
+    ) -> Dict[Tuple[str, int], Optional[str]]:
+        """Get lesson links for several (course title, lesson number) pairs at once"""
+        links_by_course: Dict[str, Dict[int, Optional[str]]] = {}
+        links = {}
+        for course_title, lesson_number in pairs:
+            if course_title not in links_by_course:
+                course_meta = self.course_metadata.get(course_title) or {}
+                links_by_course[course_title] = {
+                    lesson.get("lesson_number"): lesson.get("lesson_link")
+                    for lesson in course_meta.get("lessons", [])
+                }
+            links[(course_title, lesson_number)] = links_by_course[course_title].get(
+                lesson_number
+            )
+        return links
+
     def get_course_outline(self, course_name: str) -> Optional[Dict[str, Any]]:
         """Get course outline including title, link, and lessons"""
-        try:
-            # Find course with fuzzy matching (case-insensitive partial match)
-            matching_courses = []
-            search_term = course_name.lower()
-
-            for title, metadata in self.course_metadata.items():
-                if search_term in title.lower():
-                    matching_courses.append((title, metadata))
-
-            if not matching_courses:
-                return None
-
-            # Return the first match (could be made more sophisticated)
-            course_title, course_data = matching_courses[0]
-
-            return {
-                "course_title": course_data.get("course_title", course_title),
-                "course_link": course_data.get("course_link"),
-                "instructor": course_data.get("instructor"),
-                "num_lessons": course_data.get("num_lessons", 0),
-                "lessons": course_data.get("lessons", []),
-            }
+        # Find course with fuzzy matching (case-insensitive partial match)
+        matching_courses = []
+        search_term = course_name.lower()
 
-        except Exception as e:
-            print(f"Error getting course outline: {e}")
+        for title, metadata in self.course_metadata.items():
+            if search_term in title.lower():
+                matching_courses.append((title, metadata))
+
+        if not matching_courses:
             return None
 
+        # Return the first match (could be made more sophisticated)
+        course_title, course_data = matching_courses[0]
+
+        return {
+            "course_title": course_data.get("course_title", course_title),
+            "course_link": course_data.get("course_link"),
+            "instructor": course_data.get("instructor"),
+            "num_lessons": course_data.get("num_lessons", 0),
+            "lessons": course_data.get("lessons", []),
+        }
+
     def clear_all_data(self):
         """Clear all data"""
         try:
-            self.course_chunks = []
+            self._contents = []
+            self._metas = []
+            self._ids = []
             self.course_metadata = {}
+            self._emb_matrix = np.zeros((0, 0), dtype=np.float32)
+            self._emb_int8 = None
+            self._course_rows = {}
+            self._course_term_rows = {}
+            self._lesson_numbers = np.zeros(0, dtype=np.int32)
 
             # Remove storage files
-            for filename in ["chunks.json", "courses.json"]:
+            for filename in [
+                "chunks.jsonl",
+                "embeddings.npy",
+                "chunks.json",
+                "courses.json",
+            ]:
                 filepath = os.path.join(self.storage_path, filename)
                 if os.path.exists(filepath):
                     os.remove(filepath)
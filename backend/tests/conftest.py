@@ -2,11 +2,14 @@
 
 import os
 import sys
+from types import SimpleNamespace
+from typing import List, Optional
 from unittest.mock import MagicMock, Mock, patch
-from fastapi.testclient import TestClient
 from fastapi import FastAPI
 
+import httpx
 import pytest
+from pydantic import BaseModel
 
 # Add the parent directory to the Python path so we can import our modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -14,10 +17,48 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from ai_generator import AIGenerator
 from config import Config
 from rag_system import RAGSystem
+from response_cache import ResponseCache
 from search_tools import CourseOutlineTool, CourseSearchTool, ToolManager
+from session_manager import SessionManager
 from simple_vector_store import SearchResults, SimpleVectorStore
 
 
+# Pydantic models for request/response (duplicated to avoid importing app.py,
+# which builds the real RAG system at import time)
+class QueryRequest(BaseModel):
+    query: str
+    session_id: Optional[str] = None
+
+
+class SourceInfo(BaseModel):
+    title: str
+    lesson_number: Optional[int] = None
+    link: Optional[str] = None
+
+
+class QueryResponse(BaseModel):
+    answer: str
+    sources: List[SourceInfo]
+    session_id: str
+
+
+class CourseStats(BaseModel):
+    total_courses: int
+    course_titles: List[str]
+
+
+@pytest.fixture(scope="session")
+def api_models():
+    """The API response models, for validating response bodies in tests."""
+    return SimpleNamespace(QueryResponse=QueryResponse, CourseStats=CourseStats)
+
+
+@pytest.fixture(autouse=True)
+def fake_anthropic_api_key(monkeypatch):
+    """Keep tests from picking up a real API key from the environment."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "fake")
+
+
 @pytest.fixture
 def test_config():
     """Create a test configuration with safe settings."""
@@ -30,6 +71,62 @@ def test_config():
     return config
 
 
+@pytest.fixture(scope="session")
+def shared_vector_store():
+    """Real vector store over the configured data, built once per test session."""
+    config = Config()
+    return SimpleVectorStore(config.CHROMA_PATH, config.EMBEDDING_MODEL, 5)
+
+
+@pytest.fixture(scope="session")
+def zero_results_vector_store():
+    """Real vector store with MAX_RESULTS = 0, built once per test session."""
+    config = Config()
+    return SimpleVectorStore(config.CHROMA_PATH, config.EMBEDDING_MODEL, 0)
+
+
+@pytest.fixture(scope="session")
+def chroma_store(tmp_path_factory):
+    """Chroma vector store in a scratch directory with the course documents ingested."""
+    from document_processor import DocumentProcessor
+    from vector_store_fixed import VectorStore
+
+    config = Config()
+    docs_path = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "docs",
+    )
+    store = VectorStore(
+        str(tmp_path_factory.mktemp("chroma")), config.EMBEDDING_MODEL, 5
+    )
+    processor = DocumentProcessor(config.CHUNK_SIZE, config.CHUNK_OVERLAP)
+    courses = []
+    for file_name in sorted(os.listdir(docs_path)):
+        course, chunks = processor.process_course_document(
+            os.path.join(docs_path, file_name)
+        )
+        if course:
+            courses.append(course)
+            store.add_course_content(chunks)
+    store.add_courses_metadata(courses)
+    return store
+
+
+@pytest.fixture(scope="session")
+def warm_chroma_path(chroma_store, tmp_path_factory):
+    """Snapshot of chroma_store right after ingest, built index included."""
+    snapshot_path = str(tmp_path_factory.mktemp("chroma_snapshot"))
+    chroma_store.snapshot(snapshot_path)
+    return snapshot_path
+
+
+@pytest.fixture
+def warm_vector_store(chroma_store, warm_chroma_path):
+    """chroma_store reset to the ingest snapshot, so each test may change it freely."""
+    chroma_store.restore(warm_chroma_path)
+    return chroma_store
+
+
 @pytest.fixture
 def sample_search_results():
     """Create sample search results for testing."""
@@ -96,8 +193,11 @@ def mock_vector_store(sample_search_results, sample_course_outline):
     # Mock course outline method
     mock_store.get_course_outline.return_value = sample_course_outline
 
-    # Mock lesson link method
+    # Mock lesson link methods
     mock_store.get_lesson_link.return_value = "https://example.com/lesson"
+    mock_store.get_lesson_links.side_effect = lambda pairs: {
+        pair: "https://example.com/lesson" for pair in pairs
+    }
 
     return mock_store
 
@@ -143,11 +243,11 @@ def mock_anthropic_client():
     """Create a mock Anthropic client for testing."""
     mock_client = MagicMock()
 
-    # Mock a successful tool-free response
-    mock_response = MagicMock()
-    mock_response.content = [MagicMock()]
-    mock_response.content[0].text = "This is a test response"
-    mock_response.stop_reason = "end_turn"
+    # A successful tool-free response; plain namespaces are all the generator reads
+    mock_response = SimpleNamespace(
+        content=[SimpleNamespace(type="text", text="This is a test response")],
+        stop_reason="end_turn",
+    )
 
     mock_client.messages.create.return_value = mock_response
 
@@ -162,22 +262,26 @@ def ai_generator_with_mock_client(test_config, mock_anthropic_client):
     return generator
 
 
-@pytest.fixture
+_DEFAULT_QUERY_RESPONSE = (
+    "This is a test answer about MCP",
+    [
+        {
+            "title": "MCP: Build Rich-Context AI Apps with Anthropic",
+            "lesson_number": 1,
+            "link": "https://www.deeplearning.ai/short-courses/mcp-build-rich-context-ai-apps-with-anthropic/"
+        }
+    ]
+)
+
+
+@pytest.fixture(scope="session")
 def mock_rag_system():
-    """Create a mock RAG system for API testing."""
+    """Create a mock RAG system for API testing (shared, reset before each test)."""
     mock_rag = Mock(spec=RAGSystem)
     
-    # Mock query method to return predictable results
-    mock_rag.query.return_value = (
-        "This is a test answer about MCP",
-        [
-            {
-                "title": "MCP: Build Rich-Context AI Apps with Anthropic",
-                "lesson_number": 1,
-                "link": "https://www.deeplearning.ai/short-courses/mcp-build-rich-context-ai-apps-with-anthropic/"
-            }
-        ]
-    )
+    # Mock query methods to return predictable results
+    mock_rag.query.return_value = _DEFAULT_QUERY_RESPONSE
+    mock_rag.aquery.return_value = _DEFAULT_QUERY_RESPONSE
     
     # Mock session manager
     mock_session_manager = Mock()
@@ -196,14 +300,23 @@ def mock_rag_system():
     return mock_rag
 
 
-@pytest.fixture
+@pytest.fixture(autouse=True)
+def reset_mock_rag_system(request):
+    """Clear calls and injected failures on the shared mock RAG system."""
+    if "mock_rag_system" not in request.fixturenames:
+        return
+    mock_rag = request.getfixturevalue("mock_rag_system")
+    mock_rag.reset_mock(side_effect=True)
+    mock_rag.query.return_value = _DEFAULT_QUERY_RESPONSE
+    mock_rag.aquery.return_value = _DEFAULT_QUERY_RESPONSE
+
+
+@pytest.fixture(scope="session")
 def test_app(mock_rag_system):
     """Create a FastAPI test application with mocked dependencies."""
     from fastapi import FastAPI, HTTPException
     from fastapi.middleware.cors import CORSMiddleware
     from fastapi.middleware.trustedhost import TrustedHostMiddleware
-    from pydantic import BaseModel
-    from typing import List, Optional
     
     # Create test app without static file mounting to avoid dependency issues
     app = FastAPI(title="Course Materials RAG System Test", root_path="")
@@ -223,25 +336,6 @@ def test_app(mock_rag_system):
         expose_headers=["*"],
     )
     
-    # Pydantic models for request/response (duplicated to avoid imports)
-    class QueryRequest(BaseModel):
-        query: str
-        session_id: Optional[str] = None
-
-    class SourceInfo(BaseModel):
-        title: str
-        lesson_number: Optional[int] = None  
-        link: Optional[str] = None
-
-    class QueryResponse(BaseModel):
-        answer: str
-        sources: List[SourceInfo]
-        session_id: str
-
-    class CourseStats(BaseModel):
-        total_courses: int
-        course_titles: List[str]
-    
     # Define API endpoints with mocked RAG system
     @app.post("/api/query", response_model=QueryResponse)
     async def query_documents(request: QueryRequest):
@@ -250,7 +344,7 @@ def test_app(mock_rag_system):
             if not session_id:
                 session_id = mock_rag_system.session_manager.create_session()
             
-            answer, sources = mock_rag_system.query(request.query, session_id)
+            answer, sources = await mock_rag_system.aquery(request.query, session_id)
             
             source_objects = []
             for source in sources:
@@ -310,7 +404,41 @@ def test_app(mock_rag_system):
     return app
 
 
+@pytest.fixture(scope="session")
+def anyio_backend():
+    """Run async tests and fixtures on asyncio."""
+    return "asyncio"
+
+
+@pytest.fixture(scope="module")
+async def async_client(anyio_backend, test_app):
+    """Create an AsyncClient for the FastAPI application, reused across a module."""
+    transport = httpx.ASGITransport(app=test_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    """The production app module, imported from backend/ so its relative paths resolve."""
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+
 @pytest.fixture
-def test_client(test_app):
-    """Create a TestClient for the FastAPI application."""
-    return TestClient(test_app)
+async def app_client(anyio_backend, app_module, monkeypatch):
+    """AsyncClient for the production app, with a mocked RAG system and an empty response cache."""
+    mock_rag = Mock(spec=RAGSystem)
+    mock_rag.session_manager = SessionManager(2)
+    mock_rag.aquery.return_value = _DEFAULT_QUERY_RESPONSE
+    monkeypatch.setattr(app_module, "rag_system", mock_rag)
+    monkeypatch.setattr(app_module, "response_cache", ResponseCache(16, 60))
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
@@ -1,79 +1,272 @@
-from unittest.mock import MagicMock, Mock, call
-
-import anthropic
+import asyncio
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, Mock, call
+
+import httpx
 import pytest
 from ai_generator import (
+    ERROR_RESPONSE,
+    FOLLOWUP_SUFFIX,
     AIGenerator,
     ConversationBuilder,
     ConversationContext,
     ConversationState,
+    GenerationError,
     StateTransitionManager,
 )
 
 
+def system_text(system):
+    """Join the text of structured system blocks for substring assertions."""
+    return "\n\n".join(block["text"] for block in system)
+
+
+# Static content block specs shared by tests; tuples so responses cache by value
+_TOOL_USE_OUTLINE = (
+    {"type": "tool_use", "name": "get_course_outline", "input": {}, "id": "tool_123"},
+)
+_TOOL_USE_SEARCH = (
+    {
+        "type": "tool_use",
+        "name": "search_course_content",
+        "input": {"query": "lesson 1"},
+        "id": "tool_456",
+    },
+)
+_FINAL_TEXT = "Final response with tool result"
+
+
+@dataclass(frozen=True, slots=True)
+class TextBlock:
+    text: str
+    type: str = "text"
+
+
+@dataclass(frozen=True, slots=True)
+class ToolUseBlock:
+    name: str
+    input: dict
+    id: str = "tool_123"
+    type: str = "tool_use"
+
+
+def _block_key(block):
+    """Hashable key for a content block spec."""
+    if block["type"] == "tool_use":
+        return (
+            "tool_use",
+            block["name"],
+            json.dumps(block["input"], sort_keys=True),
+            block.get("id", "tool_123"),
+        )
+    return ("text", block.get("text", ""))
+
+
+@lru_cache(maxsize=128)
+def _cached_response(content_key, stop_reason):
+    blocks = tuple(
+        (
+            ToolUseBlock(name=key[1], input=json.loads(key[2]), id=key[3])
+            if key[0] == "tool_use"
+            else TextBlock(text=key[1])
+        )
+        for key in content_key
+    )
+    return SimpleNamespace(content=blocks, stop_reason=stop_reason)
+
+
+class _StubMessages:
+    """Stands in for client.messages: replays responses and records calls."""
+
+    def __init__(self, responses=()):
+        self._responses = iter(responses)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return next(self._responses)
+
+
 class MockClient:
     def __init__(self):
-        self.messages = Mock()
-        self.create_response_history = []
-
-    def create_mock_response(self, content, stop_reason="end_turn", tool_calls=None):
-        response = Mock()
-        response.content = []
+        self.messages = _StubMessages()
 
+    def create_mock_response(self, content, stop_reason="end_turn"):
+        # Identical responses are shared; blocks are frozen so tests cannot leak
         if isinstance(content, str):
-            text_block = Mock()
-            text_block.type = "text"
-            text_block.text = content
-            response.content = [text_block]
+            content_key = (("text", content),)
         else:
-            # Handle tool use content blocks
-            for block in content:
-                mock_block = Mock()
-                mock_block.type = block.get("type", "text")
-                if block["type"] == "tool_use":
-                    mock_block.name = block["name"]
-                    mock_block.input = block["input"]
-                    mock_block.id = block.get("id", "tool_123")
-                else:
-                    mock_block.text = block.get("text", "")
-                response.content.append(mock_block)
-
-        response.stop_reason = stop_reason
-        return response
+            content_key = tuple(_block_key(block) for block in content)
+        return _cached_response(content_key, stop_reason)
+
+
+MESSAGES_URL = "https://api.anthropic.com/v1/messages"
+
+
+def api_message(content, stop_reason="end_turn"):
+    """Messages API response body, as returned over HTTP."""
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    return {
+        "id": "msg_test",
+        "type": "message",
+        "role": "assistant",
+        "model": "claude-3-sonnet",
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": 1, "output_tokens": 1},
+    }
+
+
+OUTLINE_TOOL_MESSAGE = api_message(
+    [{"type": "tool_use", "id": "tool_123", "name": "get_course_outline", "input": {}}],
+    stop_reason="tool_use",
+)
+SEARCH_TOOL_MESSAGE = api_message(
+    [
+        {
+            "type": "tool_use",
+            "id": "tool_456",
+            "name": "search_course_content",
+            "input": {"query": "lesson 1"},
+        }
+    ],
+    stop_reason="tool_use",
+)
+
+
+def mock_messages_api(respx_mock, *messages):
+    """Serve the given response bodies, in order, to the real SDK client."""
+    return respx_mock.post(MESSAGES_URL).mock(
+        side_effect=[httpx.Response(200, json=message) for message in messages]
+    )
 
 
 class MockToolManager:
+    _RESULTS = {
+        "get_course_outline": "Course X: Lesson 1: Intro, Lesson 2: Advanced Topics",
+        "search_course_content": "Lesson content about specific topic",
+    }
+
     def __init__(self):
+        # (name, kwargs) per call, in call order
         self.executed_tools = []
 
     def execute_tool(self, name, **kwargs):
-        self.executed_tools.append({"name": name, "args": kwargs})
-        if name == "get_course_outline":
-            return "Course X: Lesson 1: Intro, Lesson 2: Advanced Topics"
-        elif name == "search_course_content":
-            return "Lesson content about specific topic"
-        return "Mock tool result"
+        self.executed_tools.append((name, kwargs))
+        return self._RESULTS.get(name, "Mock tool result")
+
+
+class _ToolBoom(Exception):
+    pass
+
+
+def _raising_tool(*args, **kwargs):
+    raise _ToolBoom("Tool execution failed")
+
+
+class _FailingMgr:
+    """Tool manager whose every tool call raises."""
+
+    execute_tool = staticmethod(_raising_tool)
+
+
+@pytest.fixture(scope="module")
+def shared_mock_anthropic_client():
+    return MockClient()
 
 
 @pytest.fixture
-def mock_anthropic_client():
-    mock_client = MockClient()
-    return mock_client
+def mock_anthropic_client(shared_mock_anthropic_client):
+    # Built once per module and reset after each test
+    yield shared_mock_anthropic_client
+    shared_mock_anthropic_client.messages = _StubMessages()
 
 
 @pytest.fixture
-def ai_generator(mock_anthropic_client):
+def isolated_mock_anthropic_client():
+    # Fresh client for tests that inject failures
+    return MockClient()
+
+
+def make_generator(client):
     generator = AIGenerator("test_api_key", "claude-3-sonnet")
-    generator.client = mock_anthropic_client
+    generator.client = client
     return generator
 
 
 @pytest.fixture
-def mock_tool_manager():
+def ai_generator(mock_anthropic_client):
+    return make_generator(mock_anthropic_client)
+
+
+@pytest.fixture
+def transport_ai_generator(monkeypatch):
+    # Real SDK client; tests intercept its HTTP calls with respx
+    monkeypatch.delenv("ANTHROPIC_BASE_URL", raising=False)
+    return AIGenerator("test_api_key", "claude-3-sonnet")
+
+
+@pytest.fixture
+def isolated_ai_generator(isolated_mock_anthropic_client):
+    return make_generator(isolated_mock_anthropic_client)
+
+
+@pytest.fixture(scope="module")
+def shared_mock_tool_manager():
     return MockToolManager()
 
 
 @pytest.fixture
+def mock_tool_manager(shared_mock_tool_manager):
+    yield shared_mock_tool_manager
+    shared_mock_tool_manager.executed_tools.clear()
+
+
+def build_conversation(client, rounds):
+    """Scripted API responses: strings end the conversation with that text,
+    tuples of block specs are tool-use rounds."""
+    return [
+        (
+            client.create_mock_response(round_)
+            if isinstance(round_, str)
+            else client.create_mock_response(round_, stop_reason="tool_use")
+        )
+        for round_ in rounds
+    ]
+
+
+@pytest.fixture(scope="session")
+def canned_conversations():
+    client = MockClient()
+    duplicate_search = ({**_TOOL_USE_SEARCH[0], "id": "tool_123"},) + _TOOL_USE_SEARCH
+    return {
+        "single_tool": build_conversation(client, (_TOOL_USE_OUTLINE, _FINAL_TEXT)),
+        "history": build_conversation(
+            client, (_TOOL_USE_OUTLINE, "Response with history")
+        ),
+        "two_tools_one_round": build_conversation(
+            client, (_TOOL_USE_OUTLINE + _TOOL_USE_SEARCH, "Combined answer")
+        ),
+        "duplicate_search": build_conversation(client, (duplicate_search, "Answer")),
+    }
+
+
+@pytest.fixture(scope="module")
+def _prompts():
+    """System prompts for the initial and follow-up states, built once."""
+    builder = ConversationBuilder(AIGenerator("test_api_key", "claude-3-sonnet"))
+    initial = ConversationContext()
+    followup = ConversationContext()
+    followup.state = ConversationState.AWAITING_FOLLOWUP
+    return builder.build_system_prompt(initial), builder.build_system_prompt(followup)
+
+
+@pytest.fixture(scope="session")
 def sample_tools():
     return [
         {
@@ -134,84 +327,56 @@ class TestStateTransitionManager:
 
 
 class TestConversationBuilder:
-    def test_build_system_prompt_initial_state(self, ai_generator):
-        builder = ConversationBuilder(ai_generator)
-        context = ConversationContext()
+    def test_build_system_prompt_initial_state(self, _prompts):
+        prompt, _ = _prompts
 
-        prompt = builder.build_system_prompt(context)
+        assert prompt[0]["text"] == AIGenerator.SYSTEM_PROMPT
+        assert prompt[0]["cache_control"] == {"type": "ephemeral"}
+        assert "follow-up round" not in system_text(prompt).lower()
 
-        assert ai_generator.SYSTEM_PROMPT in prompt
-        assert "follow-up round" not in prompt.lower()
+    def test_build_system_prompt_followup_state(self, _prompts):
+        _, prompt = _prompts
 
-    def test_build_system_prompt_followup_state(self, ai_generator):
-        builder = ConversationBuilder(ai_generator)
-        context = ConversationContext()
-        context.state = ConversationState.AWAITING_FOLLOWUP
-
-        prompt = builder.build_system_prompt(context)
+        assert prompt[0]["text"] == AIGenerator.SYSTEM_PROMPT
+        assert prompt[-1]["text"] == FOLLOWUP_SUFFIX
+        assert prompt[-1]["cache_control"] == {"type": "ephemeral"}
 
-        assert ai_generator.SYSTEM_PROMPT in prompt
-        assert "follow-up round" in prompt.lower()
-
-    def test_rollback_functionality(self, ai_generator):
+    def test_build_system_prompt_memoized_per_state(self, ai_generator):
         builder = ConversationBuilder(ai_generator)
         context = ConversationContext()
-        context.messages = [{"role": "user", "content": "original"}]
-        context.round_number = 0
-
-        # Create rollback point
-        builder.create_rollback_point(context)
-
-        # Modify context
-        context.messages.append({"role": "assistant", "content": "modified"})
-        context.round_number = 1
+        context.state = ConversationState.AWAITING_FOLLOWUP
 
-        # Rollback
-        success = builder.rollback(context)
+        first = builder.build_system_prompt(context)
 
-        assert success
-        assert len(context.messages) == 1
-        assert context.messages[0]["content"] == "original"
-        assert context.round_number == 0
+        assert builder.build_system_prompt(context) is first
+        context.state = ConversationState.TOOL_EXECUTING
+        assert builder.build_system_prompt(context) is not first
 
 
 class TestAIGenerator:
     def test_single_round_no_tools(self, ai_generator, mock_anthropic_client):
         # Setup mock response
         mock_response = mock_anthropic_client.create_mock_response("Simple response")
-        mock_anthropic_client.messages.create = Mock(return_value=mock_response)
+        mock_anthropic_client.messages = _StubMessages([mock_response])
 
         result = ai_generator.generate_response("Test query")
 
         assert result == "Simple response"
-        mock_anthropic_client.messages.create.assert_called_once()
+        assert len(mock_anthropic_client.messages.calls) == 1
 
         # Verify API parameters
-        call_args = mock_anthropic_client.messages.create.call_args
-        assert "tools" not in call_args[1]
+        assert "tools" not in mock_anthropic_client.messages.calls[0]
 
     def test_single_round_with_tool_call(
-        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
+        self,
+        ai_generator,
+        mock_anthropic_client,
+        mock_tool_manager,
+        sample_tools,
+        canned_conversations,
     ):
-        # Setup mock responses
-        tool_response = mock_anthropic_client.create_mock_response(
-            [
-                {
-                    "type": "tool_use",
-                    "name": "get_course_outline",
-                    "input": {},
-                    "id": "tool_123",
-                }
-            ],
-            stop_reason="tool_use",
-        )
-
-        final_response = mock_anthropic_client.create_mock_response(
-            "Final response with tool result"
-        )
-
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[tool_response, final_response]
+        mock_anthropic_client.messages = _StubMessages(
+            canned_conversations["single_tool"]
         )
 
         result = ai_generator.generate_response(
@@ -220,50 +385,24 @@ class TestAIGenerator:
             tool_manager=mock_tool_manager,
         )
 
-        assert result == "Final response with tool result"
+        assert result == _FINAL_TEXT
         assert len(mock_tool_manager.executed_tools) == 1
-        assert mock_tool_manager.executed_tools[0]["name"] == "get_course_outline"
+        assert mock_tool_manager.executed_tools[0][0] == "get_course_outline"
 
         # Verify two API calls were made
-        assert mock_anthropic_client.messages.create.call_count == 2
+        assert len(mock_anthropic_client.messages.calls) == 2
 
     def test_two_round_tool_calling(
-        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
+        self, transport_ai_generator, respx_mock, mock_tool_manager, sample_tools
     ):
-        # Setup mock responses for two rounds of tool calling
-        first_tool_response = mock_anthropic_client.create_mock_response(
-            [
-                {
-                    "type": "tool_use",
-                    "name": "get_course_outline",
-                    "input": {"course": "X"},
-                    "id": "tool_123",
-                }
-            ],
-            stop_reason="tool_use",
-        )
-
-        second_tool_response = mock_anthropic_client.create_mock_response(
-            [
-                {
-                    "type": "tool_use",
-                    "name": "search_course_content",
-                    "input": {"query": "lesson 1"},
-                    "id": "tool_456",
-                }
-            ],
-            stop_reason="tool_use",
+        route = mock_messages_api(
+            respx_mock,
+            OUTLINE_TOOL_MESSAGE,
+            SEARCH_TOOL_MESSAGE,
+            api_message("Comprehensive answer using both tool results"),
         )
 
-        final_response = mock_anthropic_client.create_mock_response(
-            "Comprehensive answer using both tool results"
-        )
-
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[first_tool_response, second_tool_response, final_response]
-        )
-
-        result = ai_generator.generate_response(
+        result = transport_ai_generator.generate_response(
             "Compare lesson 1 topics across courses",
             tools=sample_tools,
             tool_manager=mock_tool_manager,
@@ -271,38 +410,24 @@ class TestAIGenerator:
 
         assert result == "Comprehensive answer using both tool results"
         assert len(mock_tool_manager.executed_tools) == 2
-        assert mock_tool_manager.executed_tools[0]["name"] == "get_course_outline"
-        assert mock_tool_manager.executed_tools[1]["name"] == "search_course_content"
+        assert mock_tool_manager.executed_tools[0][0] == "get_course_outline"
+        assert mock_tool_manager.executed_tools[1][0] == "search_course_content"
 
         # Verify three API calls were made (2 tool rounds + 1 final)
-        assert mock_anthropic_client.messages.create.call_count == 3
+        assert route.call_count == 3
 
     def test_max_rounds_limit(
-        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
+        self, transport_ai_generator, respx_mock, mock_tool_manager, sample_tools
     ):
-        # Setup mock to return tool use responses indefinitely
-        tool_response = mock_anthropic_client.create_mock_response(
-            [
-                {
-                    "type": "tool_use",
-                    "name": "get_course_outline",
-                    "input": {},
-                    "id": "tool_123",
-                }
-            ],
-            stop_reason="tool_use",
-        )
-
-        final_response = mock_anthropic_client.create_mock_response(
-            "Final synthesis response"
-        )
-
         # Return tool responses for first 2 calls, then final response
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[tool_response, tool_response, final_response]
+        route = mock_messages_api(
+            respx_mock,
+            OUTLINE_TOOL_MESSAGE,
+            OUTLINE_TOOL_MESSAGE,
+            api_message("Final synthesis response"),
         )
 
-        result = ai_generator.generate_response(
+        result = transport_ai_generator.generate_response(
             "Complex multi-step query",
             tools=sample_tools,
             tool_manager=mock_tool_manager,
@@ -311,62 +436,87 @@ class TestAIGenerator:
         assert result == "Final synthesis response"
         # Should stop after 2 tool rounds
         assert len(mock_tool_manager.executed_tools) == 2
-        assert mock_anthropic_client.messages.create.call_count == 3
+        assert route.call_count == 3
 
-    def test_tool_execution_error_handling(
-        self, ai_generator, mock_anthropic_client, sample_tools
+    def test_final_round_text_skips_synthesis(
+        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
     ):
-        # Setup tool manager that raises an exception
-        failing_tool_manager = Mock()
-        failing_tool_manager.execute_tool = Mock(
-            side_effect=Exception("Tool execution failed")
+        answer = "A complete answer written alongside the last tool call. " * 5
+        first_response = mock_anthropic_client.create_mock_response(
+            [{"type": "tool_use", "name": "get_course_outline", "input": {}}],
+            stop_reason="tool_use",
         )
-
-        tool_response = mock_anthropic_client.create_mock_response(
+        last_response = mock_anthropic_client.create_mock_response(
             [
-                {
-                    "type": "tool_use",
-                    "name": "get_course_outline",
-                    "input": {},
-                    "id": "tool_123",
-                }
+                {"type": "text", "text": answer},
+                {"type": "tool_use", "name": "get_course_outline", "input": {}},
             ],
             stop_reason="tool_use",
         )
 
-        mock_anthropic_client.messages.create = Mock(return_value=tool_response)
+        mock_anthropic_client.messages = _StubMessages([first_response, last_response])
 
         result = ai_generator.generate_response(
-            "Test query", tools=sample_tools, tool_manager=failing_tool_manager
+            "Complex multi-step query",
+            tools=sample_tools,
+            tool_manager=mock_tool_manager,
         )
 
-        assert "error" in result.lower()
-        assert mock_anthropic_client.messages.create.call_count == 1
+        assert result == answer.strip()
+        assert len(mock_anthropic_client.messages.calls) == 2
+        # The final round's tool call is not run when its text is the answer
+        assert len(mock_tool_manager.executed_tools) == 1
 
-    def test_conversation_history_preservation(
-        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
+    def test_tool_execution_error_handling(
+        self, isolated_ai_generator, isolated_mock_anthropic_client, sample_tools
     ):
-        # Test that conversation history is maintained across rounds
-        first_tool_response = mock_anthropic_client.create_mock_response(
-            [
-                {
-                    "type": "tool_use",
-                    "name": "get_course_outline",
-                    "input": {},
-                    "id": "tool_123",
-                }
-            ],
+        tool_response = isolated_mock_anthropic_client.create_mock_response(
+            _TOOL_USE_OUTLINE,
             stop_reason="tool_use",
         )
 
-        final_response = mock_anthropic_client.create_mock_response(
-            "Response with history"
-        )
+        isolated_mock_anthropic_client.messages = _StubMessages([tool_response])
 
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[first_tool_response, final_response]
+        with pytest.raises(GenerationError, match=ERROR_RESPONSE):
+            isolated_ai_generator.generate_response(
+                "Test query", tools=sample_tools, tool_manager=_FailingMgr()
+            )
+
+        assert len(isolated_mock_anthropic_client.messages.calls) == 1
+
+    def test_failed_round_is_rolled_back(
+        self, isolated_ai_generator, isolated_mock_anthropic_client, sample_tools
+    ):
+        isolated_mock_anthropic_client.messages = _StubMessages(
+            [
+                isolated_mock_anthropic_client.create_mock_response(
+                    [{"type": "tool_use", "name": "get_course_outline", "input": {}}],
+                    stop_reason="tool_use",
+                )
+            ]
         )
 
+        context = ConversationContext()
+        context.messages = [{"role": "user", "content": "original"}]
+
+        with pytest.raises(GenerationError):
+            isolated_ai_generator._handle_sequential_conversation(
+                context, sample_tools, _FailingMgr()
+            )
+
+        assert context.messages == [{"role": "user", "content": "original"}]
+
+    def test_conversation_history_preservation(
+        self,
+        ai_generator,
+        mock_anthropic_client,
+        mock_tool_manager,
+        sample_tools,
+        canned_conversations,
+    ):
+        # Test that conversation history is maintained across rounds
+        mock_anthropic_client.messages = _StubMessages(canned_conversations["history"])
+
         result = ai_generator.generate_response(
             "Test query",
             conversation_history="Previous: User asked about courses",
@@ -375,54 +525,196 @@ class TestAIGenerator:
         )
 
         # Verify conversation history was included in system prompt
-        first_call_args = mock_anthropic_client.messages.create.call_args_list[0][1]
-        assert "Previous: User asked about courses" in first_call_args["system"]
+        first_call_args = mock_anthropic_client.messages.calls[0]
+        assert "Previous: User asked about courses" in system_text(
+            first_call_args["system"]
+        )
+        # Static prompt stays first so the cached prefix is reused
+        assert first_call_args["system"][0]["text"] == ai_generator.SYSTEM_PROMPT
 
     def test_system_prompt_changes_between_rounds(
-        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
+        self, transport_ai_generator, respx_mock, mock_tool_manager, sample_tools
     ):
         # Test that system prompt is enhanced for follow-up rounds
-        first_tool_response = mock_anthropic_client.create_mock_response(
-            [
-                {
-                    "type": "tool_use",
-                    "name": "get_course_outline",
-                    "input": {},
-                    "id": "tool_123",
-                }
-            ],
+        route = mock_messages_api(
+            respx_mock,
+            OUTLINE_TOOL_MESSAGE,
+            SEARCH_TOOL_MESSAGE,
+            api_message("Final response"),
+        )
+
+        transport_ai_generator.generate_response(
+            "Multi-round query", tools=sample_tools, tool_manager=mock_tool_manager
+        )
+
+        # Check that second round has enhanced system prompt
+        requests = [json.loads(call.request.content) for call in route.calls]
+        first_system = system_text(requests[0]["system"])
+        second_system = system_text(requests[1]["system"])
+
+        assert "follow-up round" not in first_system.lower()
+        assert "follow-up round" in second_system.lower()
+
+    def test_prompt_cache_breakpoints(
+        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
+    ):
+        mock_response = mock_anthropic_client.create_mock_response("Cached response")
+        mock_anthropic_client.messages = _StubMessages([mock_response])
+
+        ai_generator.generate_response(
+            "Test query", tools=sample_tools, tool_manager=mock_tool_manager
+        )
+
+        call_kwargs = mock_anthropic_client.messages.calls[-1]
+        assert call_kwargs["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert call_kwargs["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in call_kwargs["tools"][0]
+        # Caller's tool definitions are left untouched
+        assert "cache_control" not in sample_tools[-1]
+
+    def test_multiple_tools_in_one_round(
+        self,
+        ai_generator,
+        mock_anthropic_client,
+        mock_tool_manager,
+        sample_tools,
+        canned_conversations,
+    ):
+        mock_anthropic_client.messages = _StubMessages(
+            canned_conversations["two_tools_one_round"]
+        )
+
+        result = ai_generator.generate_response(
+            "Compare outline and content",
+            tools=sample_tools,
+            tool_manager=mock_tool_manager,
+        )
+
+        assert result == "Combined answer"
+        assert len(mock_tool_manager.executed_tools) == 2
+
+        # Tool results stay paired with their tool_use ids in request order
+        second_call_messages = mock_anthropic_client.messages.calls[1]["messages"]
+        tool_results = second_call_messages[-1]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["tool_123", "tool_456"]
+        assert tool_results[0]["content"].startswith("Course X")
+        assert tool_results[1]["content"] == "Lesson content about specific topic"
+
+    def test_duplicate_tool_calls_execute_once(
+        self,
+        ai_generator,
+        mock_anthropic_client,
+        mock_tool_manager,
+        sample_tools,
+        canned_conversations,
+    ):
+        mock_anthropic_client.messages = _StubMessages(
+            canned_conversations["duplicate_search"]
+        )
+
+        ai_generator.generate_response(
+            "Search twice", tools=sample_tools, tool_manager=mock_tool_manager
+        )
+
+        assert len(mock_tool_manager.executed_tools) == 1
+
+        second_call_messages = mock_anthropic_client.messages.calls[1]["messages"]
+        tool_results = second_call_messages[-1]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["tool_123", "tool_456"]
+        assert tool_results[0]["content"] == tool_results[1]["content"]
+
+    def test_async_tool_round_uses_async_client(
+        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
+    ):
+        tool_response = mock_anthropic_client.create_mock_response(
+            _TOOL_USE_OUTLINE,
             stop_reason="tool_use",
         )
+        final_response = mock_anthropic_client.create_mock_response("Async answer")
+
+        async_client = Mock()
+        async_client.messages.create = AsyncMock(
+            side_effect=[tool_response, final_response]
+        )
+        ai_generator.async_client = async_client
+
+        result = asyncio.run(
+            ai_generator.agenerate_response(
+                "What lessons are in the course?",
+                tools=sample_tools,
+                tool_manager=mock_tool_manager,
+            )
+        )
+
+        assert result == "Async answer"
+        assert async_client.messages.create.await_count == 2
+        assert mock_tool_manager.executed_tools[0][0] == "get_course_outline"
 
-        second_tool_response = mock_anthropic_client.create_mock_response(
+    def test_stream_response_streams_final_synthesis(
+        self, ai_generator, mock_anthropic_client, mock_tool_manager, sample_tools
+    ):
+        tool_response = mock_anthropic_client.create_mock_response(
             [
                 {
                     "type": "tool_use",
                     "name": "search_course_content",
-                    "input": {"query": "test"},
-                    "id": "tool_456",
+                    "input": {"query": "lesson 1"},
+                    "id": "tool_123",
                 }
             ],
             stop_reason="tool_use",
         )
 
-        final_response = mock_anthropic_client.create_mock_response("Final response")
+        class FakeStream:
+            async def __aenter__(self):
+                return self
 
-        mock_anthropic_client.messages.create = Mock(
-            side_effect=[first_tool_response, second_tool_response, final_response]
-        )
+            async def __aexit__(self, *exc):
+                return False
 
-        ai_generator.generate_response(
-            "Multi-round query", tools=sample_tools, tool_manager=mock_tool_manager
+            @property
+            async def text_stream(self):
+                for chunk in ["Streamed ", "answer"]:
+                    yield chunk
+
+        async_client = Mock()
+        async_client.messages.create = AsyncMock(
+            side_effect=[tool_response, tool_response]
+        )
+        async_client.messages.stream = Mock(return_value=FakeStream())
+        ai_generator.async_client = async_client
+
+        async def collect():
+            return [
+                chunk
+                async for chunk in ai_generator.astream_response(
+                    "Multi-round query",
+                    tools=sample_tools,
+                    tool_manager=mock_tool_manager,
+                )
+            ]
+
+        chunks = asyncio.run(collect())
+
+        assert chunks == ["Streamed ", "answer"]
+        assert async_client.messages.create.await_count == 2
+        # Final synthesis call is made without tools
+        assert "tools" not in async_client.messages.stream.call_args[1]
+
+    def test_stream_response_without_tools_yields_full_text(
+        self, ai_generator, mock_anthropic_client
+    ):
+        async_client = Mock()
+        async_client.messages.create = AsyncMock(
+            return_value=mock_anthropic_client.create_mock_response("Direct answer")
         )
+        ai_generator.async_client = async_client
 
-        # Check that second round has enhanced system prompt
-        call_args_list = mock_anthropic_client.messages.create.call_args_list
-        first_system = call_args_list[0][1]["system"]
-        second_system = call_args_list[1][1]["system"]
+        async def collect():
+            return [chunk async for chunk in ai_generator.astream_response("Hi")]
 
-        assert "follow-up round" not in first_system.lower()
-        assert "follow-up round" in second_system.lower()
+        assert asyncio.run(collect()) == ["Direct answer"]
+        async_client.messages.stream.assert_not_called()
 
 
 if __name__ == "__main__":
@@ -1,30 +1,35 @@
 """API endpoint tests for the RAG system FastAPI application."""
 
+import json
+
 import pytest
-from fastapi.testclient import TestClient
+from ai_generator import ERROR_RESPONSE, GenerationError
+
+# Async tests share the module-scoped AsyncClient on one event loop
+pytestmark = pytest.mark.anyio
 
 
 @pytest.mark.api
 class TestAPIEndpoints:
     """Test class for FastAPI endpoint testing."""
 
-    def test_root_endpoint(self, test_client):
+    async def test_root_endpoint(self, async_client):
         """Test the root endpoint returns correct message."""
-        response = test_client.get("/")
+        response = await async_client.get("/")
         
         assert response.status_code == 200
         data = response.json()
         assert "message" in data
         assert data["message"] == "Course Materials RAG System"
 
-    def test_query_endpoint_with_session_id(self, test_client):
+    async def test_query_endpoint_with_session_id(self, async_client):
         """Test the /api/query endpoint with provided session ID."""
         request_data = {
             "query": "What is MCP?",
             "session_id": "test_session_456"
         }
         
-        response = test_client.post("/api/query", json=request_data)
+        response = await async_client.post("/api/query", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
@@ -45,13 +50,13 @@ class TestAPIEndpoints:
         assert source["lesson_number"] == 1
         assert source["link"] == "https://www.deeplearning.ai/short-courses/mcp-build-rich-context-ai-apps-with-anthropic/"
 
-    def test_query_endpoint_without_session_id(self, test_client):
+    async def test_query_endpoint_without_session_id(self, async_client):
         """Test the /api/query endpoint without session ID creates new session."""
         request_data = {
             "query": "What is MCP?"
         }
         
-        response = test_client.post("/api/query", json=request_data)
+        response = await async_client.post("/api/query", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
@@ -59,32 +64,32 @@ class TestAPIEndpoints:
         # Check that session was created
         assert data["session_id"] == "test_session_123"  # From mock fixture
 
-    def test_query_endpoint_missing_query(self, test_client):
+    async def test_query_endpoint_missing_query(self, async_client):
         """Test the /api/query endpoint with missing query field."""
         request_data = {
             "session_id": "test_session"
         }
         
-        response = test_client.post("/api/query", json=request_data)
+        response = await async_client.post("/api/query", json=request_data)
         
         assert response.status_code == 422  # Validation error
 
-    def test_query_endpoint_empty_query(self, test_client):
+    async def test_query_endpoint_empty_query(self, async_client):
         """Test the /api/query endpoint with empty query."""
         request_data = {
             "query": "",
             "session_id": "test_session"
         }
         
-        response = test_client.post("/api/query", json=request_data)
+        response = await async_client.post("/api/query", json=request_data)
         
         assert response.status_code == 200
         data = response.json()
         assert "answer" in data
 
-    def test_courses_endpoint(self, test_client):
+    async def test_courses_endpoint(self, async_client):
         """Test the /api/courses endpoint returns course statistics."""
-        response = test_client.get("/api/courses")
+        response = await async_client.get("/api/courses")
         
         assert response.status_code == 200
         data = response.json()
@@ -99,9 +104,9 @@ class TestAPIEndpoints:
         assert "MCP: Build Rich-Context AI Apps with Anthropic" in data["course_titles"]
         assert "Another Test Course" in data["course_titles"]
 
-    def test_test_sources_endpoint(self, test_client):
+    async def test_test_sources_endpoint(self, async_client):
         """Test the /api/test-sources endpoint for SourceInfo serialization."""
-        response = test_client.get("/api/test-sources")
+        response = await async_client.get("/api/test-sources")
         
         assert response.status_code == 200
         data = response.json()
@@ -128,119 +133,85 @@ class TestAPIEndpoints:
         assert source2["lesson_number"] == 2
         assert source2["link"] == "https://example.com/lesson2"
 
-    def test_invalid_endpoint(self, test_client):
-        """Test that invalid endpoints return 404."""
-        response = test_client.get("/api/nonexistent")
-        assert response.status_code == 404
-
-    def test_query_endpoint_invalid_json(self, test_client):
+    async def test_query_endpoint_invalid_json(self, async_client):
         """Test the /api/query endpoint with invalid JSON data."""
-        response = test_client.post(
+        response = await async_client.post(
             "/api/query", 
-            data="invalid json",
+            content="invalid json",
             headers={"Content-Type": "application/json"}
         )
         
         assert response.status_code == 422
 
-    def test_query_endpoint_wrong_method(self, test_client):
-        """Test that GET method is not allowed for /api/query."""
-        response = test_client.get("/api/query")
-        assert response.status_code == 405  # Method not allowed
-
-    def test_courses_endpoint_wrong_method(self, test_client):
-        """Test that POST method is not allowed for /api/courses."""
-        response = test_client.post("/api/courses", json={})
-        assert response.status_code == 405  # Method not allowed
+    @pytest.mark.fast
+    @pytest.mark.parametrize(
+        "method,path,expected",
+        [
+            ("get", "/api/query", 405),  # Method not allowed
+            ("post", "/api/courses", 405),  # Method not allowed
+            ("get", "/api/nonexistent", 404),
+        ],
+    )
+    async def test_unroutable_requests(self, async_client, method, path, expected):
+        """Test wrong methods and unknown endpoints are rejected."""
+        response = await getattr(async_client, method)(path)
+        assert response.status_code == expected
 
 
 @pytest.mark.api
 class TestAPIResponseFormats:
     """Test class for API response format validation."""
 
-    def test_query_response_model_validation(self, test_client):
+    async def test_query_response_model_validation(self, async_client, api_models):
         """Test that query response follows the correct Pydantic model."""
         request_data = {
             "query": "Test query",
             "session_id": "test_session"
         }
         
-        response = test_client.post("/api/query", json=request_data)
+        response = await async_client.post("/api/query", json=request_data)
         assert response.status_code == 200
         
-        data = response.json()
-        
-        # Test required fields exist
-        required_fields = ["answer", "sources", "session_id"]
-        for field in required_fields:
-            assert field in data
-        
-        # Test field types
-        assert isinstance(data["answer"], str)
-        assert isinstance(data["sources"], list)
-        assert isinstance(data["session_id"], str)
-        
-        # Test source structure if sources exist
-        if data["sources"]:
-            for source in data["sources"]:
-                assert isinstance(source, dict)
-                assert "title" in source
-                assert isinstance(source["title"], str)
-                
-                # Optional fields
-                if "lesson_number" in source:
-                    assert isinstance(source["lesson_number"], int)
-                if "link" in source:
-                    assert isinstance(source["link"], str)
-
-    def test_courses_response_model_validation(self, test_client):
+        # Strict validation rejects missing fields and mistyped values
+        model = api_models.QueryResponse.model_validate_json(response.content, strict=True)
+        assert model.sources[0].title
+
+    async def test_courses_response_model_validation(self, async_client, api_models):
         """Test that courses response follows the correct Pydantic model."""
-        response = test_client.get("/api/courses")
+        response = await async_client.get("/api/courses")
         assert response.status_code == 200
         
-        data = response.json()
-        
-        # Test required fields exist
-        required_fields = ["total_courses", "course_titles"]
-        for field in required_fields:
-            assert field in data
-        
-        # Test field types
-        assert isinstance(data["total_courses"], int)
-        assert isinstance(data["course_titles"], list)
-        
-        # Test that all course titles are strings
-        for title in data["course_titles"]:
-            assert isinstance(title, str)
+        model = api_models.CourseStats.model_validate_json(response.content, strict=True)
+        assert model.course_titles
 
 
 @pytest.mark.api
 class TestAPIErrorHandling:
     """Test class for API error handling scenarios."""
 
-    def test_internal_server_error_simulation(self, test_client, mock_rag_system):
+    async def test_internal_server_error_simulation(self, async_client, mock_rag_system):
         """Test that internal server errors are properly handled."""
         # Make the mock RAG system raise an exception
-        mock_rag_system.query.side_effect = Exception("Test error")
+        mock_rag_system.aquery.side_effect = Exception("Test error")
         
         request_data = {
             "query": "This should fail",
             "session_id": "test_session"
         }
         
-        response = test_client.post("/api/query", json=request_data)
+        response = await async_client.post("/api/query", json=request_data)
         
         assert response.status_code == 500
         data = response.json()
         assert "detail" in data
         assert data["detail"] == "Test error"
 
-    def test_courses_endpoint_error_handling(self, test_client, mock_rag_system):
+    async def test_courses_endpoint_error_handling(self, async_client, mock_rag_system):
         """Test error handling for /api/courses endpoint."""
         # Make the mock RAG system raise an exception for analytics
         mock_rag_system.get_course_analytics.side_effect = Exception("Analytics error")
         
-        response = test_client.get("/api/courses")
+        response = await async_client.get("/api/courses")
         
         assert response.status_code == 500
         data = response.json()
@@ -252,12 +223,12 @@ class TestAPIErrorHandling:
 class TestAPIIntegration:
     """Integration tests for API endpoints working together."""
 
-    def test_multiple_queries_same_session(self, test_client):
+    async def test_multiple_queries_same_session(self, async_client):
         """Test multiple queries using the same session ID."""
         session_id = "consistent_session"
         
         # First query
-        response1 = test_client.post("/api/query", json={
+        response1 = await async_client.post("/api/query", json={
             "query": "First query",
             "session_id": session_id
         })
@@ -267,7 +238,7 @@ class TestAPIIntegration:
         assert data1["session_id"] == session_id
         
         # Second query with same session
-        response2 = test_client.post("/api/query", json={
+        response2 = await async_client.post("/api/query", json={
             "query": "Second query", 
             "session_id": session_id
         })
@@ -276,7 +247,7 @@ class TestAPIIntegration:
         data2 = response2.json()
         assert data2["session_id"] == session_id
 
-    def test_cors_headers(self, test_client):
+    async def test_cors_headers(self, async_client):
         """Test that CORS headers are properly set on actual requests."""
         # Use a real request instead of OPTIONS to verify CORS headers
         request_data = {
@@ -284,11 +255,114 @@ class TestAPIIntegration:
             "session_id": "cors_test_session"
         }
         
-        response = test_client.post("/api/query", json=request_data)
+        response = await async_client.post("/api/query", json=request_data)
         assert response.status_code == 200
         
         # Check that CORS headers exist on the response
         headers = response.headers
         # CORS headers are often normalized to lowercase by test clients
         header_keys = [key.lower() for key in headers.keys()]
-        assert any("access-control-allow" in key for key in header_keys) or response.status_code == 200
\ No newline at end of file
+        assert any("access-control-allow" in key for key in header_keys) or response.status_code == 200
+
+
+def _stream_events(*events, error=None):
+    """Stand-in for RAGSystem.astream_query that yields the given events, then optionally fails."""
+    async def astream_query(query, session_id):
+        for event in events:
+            yield event
+        if error is not None:
+            raise error
+    return astream_query
+
+
+def _parse_sse(body):
+    """Decode the payloads of a server-sent event stream."""
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+@pytest.mark.api
+class TestResponseCaching:
+    """Response caching in the production app's query endpoints."""
+
+    async def test_query_answer_is_cached(self, app_client, app_module):
+        """A repeated query is answered from the cache."""
+        request_data = {"query": "What is MCP?", "session_id": "cache_session"}
+        
+        response1 = await app_client.post("/api/query", json=request_data)
+        response2 = await app_client.post("/api/query", json=request_data)
+        
+        assert response1.status_code == 200
+        assert response2.json()["answer"] == response1.json()["answer"]
+        assert app_module.rag_system.aquery.call_count == 1
+
+    async def test_failed_query_is_not_cached(self, app_client, app_module):
+        """A failed generation is reported as an error and retried on the next request."""
+        request_data = {"query": "What is MCP?", "session_id": "cache_session"}
+        app_module.rag_system.aquery.side_effect = GenerationError(ERROR_RESPONSE)
+        
+        response = await app_client.post("/api/query", json=request_data)
+        
+        assert response.status_code == 500
+        assert response.json()["detail"] == ERROR_RESPONSE
+        assert len(app_module.response_cache) == 0
+        
+        app_module.rag_system.aquery.side_effect = None
+        response = await app_client.post("/api/query", json=request_data)
+        
+        assert response.status_code == 200
+        assert app_module.rag_system.aquery.call_count == 2
+
+    async def test_streamed_answer_is_cached(self, app_client, app_module):
+        """A fully streamed answer is cached and replayed as a single delta."""
+        request_data = {"query": "What is MCP?", "session_id": "cache_session"}
+        app_module.rag_system.astream_query.side_effect = _stream_events(
+            {"delta": "MCP is "}, {"delta": "a protocol"}, {"sources": []}
+        )
+        
+        response1 = await app_client.post("/api/query/stream", json=request_data)
+        response2 = await app_client.post("/api/query/stream", json=request_data)
+        
+        assert _parse_sse(response1.text)[:2] == [{"delta": "MCP is "}, {"delta": "a protocol"}]
+        events = _parse_sse(response2.text)
+        assert events[0] == {"delta": "MCP is a protocol"}
+        assert events[1]["session_id"] == "cache_session"
+        assert app_module.rag_system.astream_query.call_count == 1
+
+    async def test_failed_stream_is_not_cached(self, app_client, app_module):
+        """A stream that fails part way reports the error in-band and caches nothing."""
+        request_data = {"query": "What is MCP?", "session_id": "cache_session"}
+        app_module.rag_system.astream_query.side_effect = _stream_events(
+            {"delta": "MCP is "}, error=GenerationError(ERROR_RESPONSE)
+        )
+        
+        response = await app_client.post("/api/query/stream", json=request_data)
+        
+        assert _parse_sse(response.text) == [{"delta": "MCP is "}, {"error": ERROR_RESPONSE}]
+        assert len(app_module.response_cache) == 0
+
+    async def test_cache_clear(self, app_client, app_module):
+        """Clearing the cache makes the next repeated query generate a fresh answer."""
+        request_data = {"query": "What is MCP?", "session_id": "cache_session"}
+        
+        await app_client.post("/api/query", json=request_data)
+        response = await app_client.post("/api/cache/clear")
+        
+        assert response.json() == {"status": "cleared"}
+        assert len(app_module.response_cache) == 0
+        
+        await app_client.post("/api/query", json=request_data)
+        assert app_module.rag_system.aquery.call_count == 2
+
+
+@pytest.mark.api
+class TestAppLogging:
+    """Logging in the production app."""
+
+    async def test_logs_are_not_queued_without_lifespan(self, app_client, app_module):
+        """Without the startup hook nothing drains the log queue, so nothing is queued."""
+        app_module.rag_system.aquery.side_effect = RuntimeError("Test error")
+        
+        response = await app_client.post("/api/query", json={"query": "What is MCP?"})
+        
+        assert response.status_code == 500
+        assert app_module.log_queue.empty()
@@ -3,10 +3,23 @@
 from unittest.mock import Mock
 
 import pytest
-from search_tools import CourseSearchTool
+from search_tools import CourseSearchTool, Tool, ToolManager, ToolRun
 from simple_vector_store import SearchResults
 
 
+class _TitleSourceTool(Tool):
+    """Tool whose only source is titled after its input."""
+
+    def get_tool_definition(self):
+        return {"name": "title_source", "input_schema": {"type": "object"}}
+
+    def execute(self, title):
+        return title
+
+    def run(self, title):
+        return title, [{"title": title, "lesson_number": None, "link": None}]
+
+
 class TestCourseSearchTool:
     """Test CourseSearchTool execute method and result formatting."""
 
@@ -63,15 +76,17 @@ class TestCourseSearchTool:
         self, mock_vector_store, sample_search_results
     ):
         """Test that lesson links are properly retrieved and formatted."""
-        mock_vector_store.get_lesson_link.return_value = "https://example.com/lesson1"
+        mock_vector_store.get_lesson_links.side_effect = lambda pairs: {
+            pair: "https://example.com/lesson1" for pair in pairs
+        }
 
         tool = CourseSearchTool(mock_vector_store)
         tool.store.search.return_value = sample_search_results
 
         result = tool.execute("test query")
 
-        # Check that lesson links were requested
-        mock_vector_store.get_lesson_link.assert_called()
+        # Check that lesson links were requested in a single batch
+        mock_vector_store.get_lesson_links.assert_called_once()
 
         # Check that sources contain links
         assert len(tool.last_sources) > 0
@@ -81,23 +96,16 @@ class TestCourseSearchTool:
 class TestCourseSearchToolIntegration:
     """Integration tests with real vector store to identify issues."""
 
-    def test_real_vector_store_search(self):
+    def test_real_vector_store_search(self, zero_results_vector_store):
         """Test CourseSearchTool with real vector store configuration."""
-        from config import Config
-        from simple_vector_store import SimpleVectorStore
-
-        # Use current configuration (which has MAX_RESULTS = 0)
-        config = Config()
-        store = SimpleVectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS
-        )
-
+        # The current configuration has MAX_RESULTS = 0
+        store = zero_results_vector_store
         tool = CourseSearchTool(store)
 
         # Test a query that should return results
         result = tool.execute("MCP server creation", course_name="MCP")
 
-        print(f"Real vector store result with MAX_RESULTS={config.MAX_RESULTS}:")
+        print(f"Real vector store result with MAX_RESULTS={store.max_results}:")
         print(result)
         print(f"Sources tracked: {len(tool.last_sources)}")
 
@@ -106,18 +114,9 @@ class TestCourseSearchToolIntegration:
             print("ISSUE CONFIRMED: Real vector store returns no results!")
             print("This is likely due to MAX_RESULTS = 0 configuration")
 
-    def test_real_vector_store_search_with_fixed_config(self):
+    def test_real_vector_store_search_with_fixed_config(self, shared_vector_store):
         """Test CourseSearchTool with corrected configuration."""
-        from config import Config
-        from simple_vector_store import SimpleVectorStore
-
-        # Use corrected configuration
-        config = Config()
-        store = SimpleVectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, 5
-        )  # Fixed MAX_RESULTS
-
-        tool = CourseSearchTool(store)
+        tool = CourseSearchTool(shared_vector_store)
 
         # Test the same query
         result = tool.execute("MCP server creation", course_name="MCP")
@@ -130,17 +129,9 @@ class TestCourseSearchToolIntegration:
         if "No relevant content found" not in result:
             print("ISSUE RESOLVED: Fixed configuration returns results!")
 
-    def test_lesson_specific_search_real(self):
+    def test_lesson_specific_search_real(self, shared_vector_store):
         """Test lesson-specific search with real vector store."""
-        from config import Config
-        from simple_vector_store import SimpleVectorStore
-
-        config = Config()
-        store = SimpleVectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, 5
-        )  # Use working config
-
-        tool = CourseSearchTool(store)
+        tool = CourseSearchTool(shared_vector_store)
 
         # Test lesson 5 specifically (Creating An MCP Client)
         result = tool.execute("client", course_name="MCP", lesson_number=5)
@@ -154,17 +145,9 @@ class TestCourseSearchToolIntegration:
         else:
             print("Success: Lesson-specific search works with corrected config")
 
-    def test_various_content_queries_real(self):
+    def test_various_content_queries_real(self, shared_vector_store):
         """Test various content queries that users might ask."""
-        from config import Config
-        from simple_vector_store import SimpleVectorStore
-
-        config = Config()
-        store = SimpleVectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, 5
-        )  # Use working config
-
-        tool = CourseSearchTool(store)
+        tool = CourseSearchTool(shared_vector_store)
 
         test_queries = [
             ("What does lesson 5 cover?", "MCP", 5),
@@ -186,3 +169,150 @@ class TestCourseSearchToolIntegration:
 
             print(f"Sources: {len(tool.last_sources)}")
             tool.last_sources = []  # Reset for next test
+
+
+@pytest.mark.integration
+class TestCourseSearchToolChroma:
+    """Test CourseSearchTool against the Chroma vector store."""
+
+    def test_execute_batch_with_lesson_links(self, chroma_store):
+        """A batch of searches returns results and lesson links from the catalog."""
+        tool = CourseSearchTool(chroma_store)
+
+        outputs = tool.execute_batch(
+            [
+                {"query": "MCP server", "course_name": "MCP"},
+                {
+                    "query": "creating a client",
+                    "course_name": "MCP",
+                    "lesson_number": 5,
+                },
+            ]
+        )
+
+        assert len(outputs) == 2
+        assert all("No relevant content found" not in output for output in outputs)
+        lesson_sources = [
+            source
+            for source in tool.last_sources
+            if source["lesson_number"] is not None
+        ]
+        assert lesson_sources
+        assert all(source["link"] for source in lesson_sources)
+
+
+class TestToolManagerSources:
+    """Test source tracking through the ToolManager."""
+
+    def test_last_sources_follow_executed_tool(self, tool_manager):
+        """Sources come from the source-tracking tool that last ran."""
+        assert tool_manager.get_last_sources() == []
+
+        tool_manager.execute_tool("search_course_content", query="MCP server")
+        sources = tool_manager.get_last_sources()
+        assert sources[0]["title"] == "MCP: Build Rich-Context AI Apps with Anthropic"
+
+        # Outline tool does not track sources, so search sources remain
+        tool_manager.execute_tool("get_course_outline", course_name="MCP")
+        assert tool_manager.get_last_sources() == sources
+
+    def test_reset_sources(self, tool_manager):
+        """Reset clears tracked sources on every source-tracking tool."""
+        tool_manager.execute_tool("search_course_content", query="MCP server")
+        tool_manager.reset_sources()
+
+        assert tool_manager.get_last_sources() == []
+        assert tool_manager.tools["search_course_content"].last_sources == []
+
+    def test_tool_runs_collect_their_own_sources(self, tool_manager):
+        """Each query's ToolRun keeps only its own sources, off the shared tools."""
+        first = ToolRun(tool_manager)
+        second = ToolRun(tool_manager)
+
+        first.execute_tool("search_course_content", query="MCP server")
+        second.execute_tool("get_course_outline", course_name="MCP")
+
+        assert first.sources[0]["title"] == (
+            "MCP: Build Rich-Context AI Apps with Anthropic"
+        )
+        assert second.sources == []
+        assert tool_manager.get_last_sources() == []
+
+    def test_tool_run_collects_batched_sources(
+        self, tool_manager, mock_vector_store, sample_search_results
+    ):
+        """Sources of a batched round land on the ToolRun, not the search tool."""
+        mock_vector_store.batch_search.return_value = [
+            sample_search_results,
+            sample_search_results,
+        ]
+        run = ToolRun(tool_manager)
+
+        results = run.execute_batched(
+            [
+                ("search_course_content", {"query": "MCP server"}),
+                ("search_course_content", {"query": "MCP client"}),
+            ]
+        )
+
+        assert set(results) == {0, 1}
+        # Both searches found the same three sources
+        assert len(run.sources) == 3
+        assert tool_manager.tools["search_course_content"].last_sources == []
+
+    def test_tool_run_sources_follow_call_order(self):
+        """Sources come back in call order across rounds, each listed once."""
+        manager = ToolManager()
+        manager.register_tool(_TitleSourceTool())
+        run = ToolRun(manager)
+
+        # Round one's calls finish in reverse order
+        run.execute_batched(
+            [("title_source", {"title": "A"}), ("title_source", {"title": "B"})]
+        )
+        run.execute_tool("title_source", title="B")
+        run.execute_tool("title_source", title="A")
+
+        # Round two repeats a source already found
+        run.execute_batched(
+            [("title_source", {"title": "C"}), ("title_source", {"title": "A"})]
+        )
+        run.execute_tool("title_source", title="A")
+        run.execute_tool("title_source", title="C")
+
+        assert [source["title"] for source in run.sources] == ["A", "B", "C"]
+
+    def test_tool_definitions_cached_until_register(self, tool_manager):
+        """Definitions are built once and rebuilt after a new registration."""
+        definitions = tool_manager.get_tool_definitions()
+        assert tool_manager.get_tool_definitions() is definitions
+
+        tool_manager.register_tool(tool_manager.tools["get_course_outline"])
+        assert tool_manager.get_tool_definitions() is not definitions
+
+    def test_repeated_searches_are_batched(
+        self, tool_manager, mock_vector_store, sample_search_results
+    ):
+        """Several search calls share one batch_search; other tools are left alone."""
+        mock_vector_store.batch_search.return_value = [
+            sample_search_results,
+            sample_search_results,
+        ]
+
+        results = tool_manager.execute_batched(
+            [
+                ("search_course_content", {"query": "MCP server"}),
+                ("get_course_outline", {"course_name": "MCP"}),
+                ("search_course_content", {"query": "MCP client", "lesson_number": 5}),
+            ]
+        )
+
+        assert set(results) == {0, 2}
+        mock_vector_store.batch_search.assert_called_once_with(
+            queries=["MCP server", "MCP client"],
+            course_names=[None, None],
+            lesson_numbers=[None, 5],
+        )
+        mock_vector_store.search.assert_not_called()
+        mock_vector_store.get_lesson_links.assert_called_once()
+        assert len(tool_manager.get_last_sources()) == 6
@@ -0,0 +1,67 @@
+"""Tests for the query response cache."""
+
+import pytest
+from response_cache import ResponseCache
+
+
+class TestResponseCache:
+    """Test key normalization, LRU eviction and TTL expiry."""
+
+    def test_key_normalizes_query(self):
+        """Whitespace and case differences map to the same key."""
+        key1 = ResponseCache.make_key("What is MCP?", None, "tools")
+        key2 = ResponseCache.make_key("  what is mcp?  ", None, "tools")
+
+        assert key1 == key2
+
+    def test_key_depends_on_history_and_tools(self):
+        """Different session history or tool schemas produce different keys."""
+        base = ResponseCache.make_key("What is MCP?", None, "tools")
+
+        assert base != ResponseCache.make_key("What is MCP?", "User: hi", "tools")
+        assert base != ResponseCache.make_key("What is MCP?", None, "other-tools")
+
+    def test_hash_tools_ignores_key_order(self):
+        """Tool schema hash ignores dict key ordering."""
+        tools_a = [{"name": "search", "description": "d"}]
+        tools_b = [{"description": "d", "name": "search"}]
+
+        assert ResponseCache.hash_tools(tools_a) == ResponseCache.hash_tools(tools_b)
+
+    def test_get_and_put(self):
+        """Stored values are returned until cleared."""
+        cache = ResponseCache(max_size=2)
+        cache.put("a", ("answer", []))
+
+        assert cache.get("a") == ("answer", [])
+        assert cache.get("missing") is None
+
+        cache.clear()
+        assert cache.get("a") is None
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted when full."""
+        cache = ResponseCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.put("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+
+    def test_ttl_expiry(self, monkeypatch):
+        """Entries older than the TTL are dropped."""
+        now = [1000.0]
+        monkeypatch.setattr("response_cache.time.monotonic", lambda: now[0])
+
+        cache = ResponseCache(ttl_seconds=10)
+        cache.put("a", 1)
+
+        now[0] += 5
+        assert cache.get("a") == 1
+
+        now[0] += 10
+        assert cache.get("a") is None
@@ -1,7 +1,12 @@
 """Tests for vector store functionality, particularly the MAX_RESULTS configuration issue."""
 
+import os
+
+import numpy as np
 import pytest
 from config import Config
+import simple_vector_store
+from models import Course, CourseChunk
 from simple_vector_store import SimpleVectorStore
 
 
@@ -38,12 +43,9 @@ class TestVectorStore:
 
         assert store.max_results == 5, "Vector store should have max_results = 5"
 
-    def test_search_with_zero_max_results(self):
+    def test_search_with_zero_max_results(self, zero_results_vector_store):
         """Test search behavior when max_results is 0."""
-        config = Config()
-        store = SimpleVectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, 0
-        )  # Explicitly set to 0
+        store = zero_results_vector_store
 
         # Perform a search
         results = store.search("MCP server creation", course_name="MCP", limit=None)
@@ -56,12 +58,9 @@ class TestVectorStore:
         if len(results.documents) == 0:
             print("ISSUE IDENTIFIED: MAX_RESULTS = 0 causes empty search results!")
 
-    def test_search_with_valid_max_results(self):
+    def test_search_with_valid_max_results(self, shared_vector_store):
         """Test search behavior with valid max_results."""
-        config = Config()
-        store = SimpleVectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, 5
-        )  # Use valid setting
+        store = shared_vector_store
 
         # Perform the same search
         results = store.search("MCP server creation", course_name="MCP", limit=None)
@@ -70,12 +69,9 @@ class TestVectorStore:
 
         # This should return actual results if the issue is MAX_RESULTS = 0
 
-    def test_search_with_explicit_limit_override(self):
+    def test_search_with_explicit_limit_override(self, zero_results_vector_store):
         """Test if providing explicit limit can override the max_results = 0."""
-        config = Config()
-        store = SimpleVectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, 0
-        )  # Problematic setting
+        store = zero_results_vector_store
 
         # Try to override with explicit limit
         results = store.search("MCP server creation", course_name="MCP", limit=5)
@@ -84,10 +80,9 @@ class TestVectorStore:
             f"Search results with MAX_RESULTS=0 but limit=5: {len(results.documents)} documents"
         )
 
-    def test_course_count_and_data_availability(self):
+    def test_course_count_and_data_availability(self, shared_vector_store):
         """Test if course data is actually loaded in the vector store."""
-        config = Config()
-        store = SimpleVectorStore(config.CHROMA_PATH, config.EMBEDDING_MODEL, 5)
+        store = shared_vector_store
 
         course_count = store.get_course_count()
         print(f"Course count in vector store: {course_count}")
@@ -106,11 +101,9 @@ class TestVectorStore:
 class TestVectorStoreSearch:
     """Test actual search functionality."""
 
-    def test_direct_search_functionality(self):
+    def test_direct_search_functionality(self, shared_vector_store):
         """Test the vector store search with various parameters."""
-        config = Config()
-        # Use a working configuration
-        store = SimpleVectorStore(config.CHROMA_PATH, config.EMBEDDING_MODEL, 5)
+        store = shared_vector_store
 
         # Test searches that should work
         test_queries = [
@@ -133,10 +126,9 @@ class TestVectorStoreSearch:
                 print("No results found")
             print("-" * 50)
 
-    def test_lesson_specific_search(self):
+    def test_lesson_specific_search(self, shared_vector_store):
         """Test searching within specific lessons."""
-        config = Config()
-        store = SimpleVectorStore(config.CHROMA_PATH, config.EMBEDDING_MODEL, 5)
+        store = shared_vector_store
 
         # Test lesson-specific searches
         results = store.search("server", course_name="MCP", lesson_number=4)
@@ -144,3 +136,195 @@ class TestVectorStoreSearch:
 
         results = store.search("client", course_name="MCP", lesson_number=5)
         print(f"Lesson 5 search results: {len(results.documents)} documents")
+
+
+def _chunks(course_title, count, lesson_number=1):
+    return [
+        CourseChunk(
+            content=f"{course_title} chunk {i} about servers and clients",
+            course_title=course_title,
+            lesson_number=lesson_number,
+            chunk_index=i,
+        )
+        for i in range(count)
+    ]
+
+
+class TestVectorStorePersistence:
+    """Test the append-only chunk files of SimpleVectorStore."""
+
+    def test_appended_chunks_survive_reload(self, tmp_path):
+        """Chunks added in separate batches are all loaded back."""
+        config = Config()
+        store = SimpleVectorStore(str(tmp_path), config.EMBEDDING_MODEL, 5)
+        store.add_course_content(_chunks("Course A", 3))
+        store.add_course_content(_chunks("Course B", 2))
+
+        reloaded = SimpleVectorStore(str(tmp_path), config.EMBEDDING_MODEL, 5)
+        assert len(reloaded._contents) == 5
+        assert reloaded._emb_matrix.shape[0] == 5
+        assert not reloaded.search("servers", course_name="Course B").is_empty()
+
+    def test_mismatched_files_are_not_loaded(self, tmp_path):
+        """A chunk file that disagrees with the embeddings is rejected."""
+        config = Config()
+        store = SimpleVectorStore(str(tmp_path), config.EMBEDDING_MODEL, 5)
+        store.add_course_content(_chunks("Course A", 3))
+
+        chunks_file = os.path.join(str(tmp_path), "chunks.jsonl")
+        with open(chunks_file, "rb") as f:
+            lines = f.readlines()
+        with open(chunks_file, "wb") as f:
+            f.writelines(lines[:-1])
+
+        reloaded = SimpleVectorStore(str(tmp_path), config.EMBEDDING_MODEL, 5)
+        assert reloaded._contents == []
+        assert reloaded.search("servers").is_empty()
+
+    def test_failed_save_is_made_good_by_the_next(self, tmp_path, monkeypatch):
+        """After a failed save, the next one rewrites both files from memory."""
+        config = Config()
+        store = SimpleVectorStore(str(tmp_path), config.EMBEDDING_MODEL, 5)
+        store.add_course_metadata(Course(title="Course A"))
+        store.add_course_content(_chunks("Course A", 3))
+
+        def fail(start):
+            raise OSError("disk full")
+
+        with monkeypatch.context() as m:
+            m.setattr(store, "_chunk_records", fail)
+            store.add_course_metadata(Course(title="Course B"))
+            store.add_course_content(_chunks("Course B", 2))
+
+        # Course B's content is not on disk, so neither is its metadata
+        reloaded = SimpleVectorStore(str(tmp_path), config.EMBEDDING_MODEL, 5)
+        assert len(reloaded._contents) == 3
+        assert reloaded.get_existing_course_titles() == ["Course A"]
+
+        store.add_course_metadata(Course(title="Course C"))
+        store.add_course_content(_chunks("Course C", 1))
+
+        reloaded = SimpleVectorStore(str(tmp_path), config.EMBEDDING_MODEL, 5)
+        assert len(reloaded._contents) == 6
+        assert reloaded._emb_matrix.shape[0] == 6
+        assert sorted(reloaded.get_existing_course_titles()) == [
+            "Course A",
+            "Course B",
+            "Course C",
+        ]
+
+    def test_lesson_zero_filter(self, tmp_path):
+        """Lesson 0 is a real lesson filter, not the same as no filter."""
+        config = Config()
+        store = SimpleVectorStore(str(tmp_path), config.EMBEDDING_MODEL, 5)
+        store.add_course_content(_chunks("Course A", 2, lesson_number=0))
+        store.add_course_content(_chunks("Course B", 2, lesson_number=1))
+
+        results = store.search("servers", lesson_number=0)
+        assert len(results.documents) == 2
+        assert all(meta["lesson_number"] == 0 for meta in results.metadata)
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    """Small random mean-pooled BERT, built locally, that lower-cases its input
+    in SentenceTransformer rather than in the tokenizer."""
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    path = tmp_path_factory.mktemp("tiny_model")
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "what", "is", "mcp", "?"]
+    vocab_file = path / "vocab.txt"
+    vocab_file.write_text("\n".join(vocab))
+    BertTokenizerFast(str(vocab_file), do_lower_case=False).save_pretrained(path)
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+    )
+    BertModel(config).save_pretrained(path)
+
+    transformer = Transformer(str(path), do_lower_case=True)
+    return SentenceTransformer(modules=[transformer, Pooling(32, "mean"), Normalize()])
+
+
+class TestQueryEncoding:
+    """Test the single-query fast path of SimpleVectorStore."""
+
+    def test_fast_path_matches_encode(self, tmp_path, tiny_model, monkeypatch):
+        """The fast path preprocesses queries like encode(), whitespace and case included."""
+        monkeypatch.setattr(simple_vector_store, "_get_model", lambda name: tiny_model)
+        store = SimpleVectorStore(str(tmp_path), "tiny-model", 5)
+        query = "  What is MCP?  "
+
+        fast = store._encode_query_fast(query)
+
+        assert fast is not None
+        expected = tiny_model.encode(query, normalize_embeddings=True)
+        np.testing.assert_allclose(fast[0], expected, atol=1e-5)
+
+
+@pytest.mark.integration
+class TestChromaSnapshot:
+    """Test snapshotting and restoring the Chroma vector store."""
+
+    def test_restore_brings_back_cleared_data(
+        self, warm_vector_store, warm_chroma_path
+    ):
+        """Restoring the ingest snapshot undoes clear_all_data without re-ingesting."""
+        course_count = warm_vector_store.get_course_count()
+        assert course_count > 0
+
+        warm_vector_store.clear_all_data()
+        assert warm_vector_store.get_course_count() == 0
+
+        warm_vector_store.restore(warm_chroma_path)
+        assert warm_vector_store.get_course_count() == course_count
+        assert not warm_vector_store.search("MCP").is_empty()
+
+    def test_course_filter_matches_title_substring(self, warm_vector_store):
+        """A course filter matches any title containing it, ignoring case."""
+        results = warm_vector_store.search("server", course_name="mcp")
+
+        assert results.error is None
+        assert not results.is_empty()
+        assert all("MCP" in meta["course_title"] for meta in results.metadata)
+
+        unknown = warm_vector_store.search("server", course_name="No Such Course")
+        assert unknown.error is None
+        assert unknown.is_empty()
+
+    def test_default_search_ranks_by_exact_distance(self, warm_vector_store):
+        """By default results are ranked by unquantized float32 cosine distance."""
+        query = "creating an MCP client"
+        results = warm_vector_store.search(query)
+
+        query_row = warm_vector_store._encode_texts([query])[0]
+        document_rows = warm_vector_store._encode_texts(results.documents)
+        expected = 1.0 - document_rows @ query_row
+
+        np.testing.assert_allclose(results.distances, expected, atol=1e-6)
+        assert results.distances == sorted(results.distances)
+
+    def test_stores_share_one_model(self, chroma_store, tmp_path):
+        """A store at another path reuses the already loaded embedding model."""
+        from vector_store_fixed import VectorStore
+
+        other = VectorStore(str(tmp_path), Config().EMBEDDING_MODEL, 5)
+
+        assert other.embedding_model is chroma_store.embedding_model
+
+    def test_duplicate_titles_in_one_metadata_batch(self, warm_vector_store):
+        """A batch that repeats a title adds one catalog entry, the last one."""
+        course_count = warm_vector_store.get_course_count()
+        first = Course(title="Duplicate Course", instructor="First", course_link="a")
+        last = Course(title="Duplicate Course", instructor="Last", course_link="b")
+
+        warm_vector_store.add_courses_metadata([first, last])
+
+        assert warm_vector_store.get_course_count() == course_count + 1
+        entry = warm_vector_store.course_catalog.get(ids=["course_Duplicate Course"])
+        assert entry["metadatas"][0]["instructor"] == "Last"
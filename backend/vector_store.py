@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import chromadb
 from chromadb.config import Settings
@@ -216,8 +216,8 @@ class VectorStore:
     def get_existing_course_titles(self) -> List[str]:
         """Get all existing course titles from the vector store"""
         try:
-            # Get all documents from the catalog
-            results = self.course_catalog.get()
+            # Titles are the IDs, which get() always returns
+            results = self.course_catalog.get(include=[])
             if results and "ids" in results:
                 return results["ids"]
             return []
@@ -228,10 +228,7 @@ class VectorStore:
     def get_course_count(self) -> int:
         """Get the total number of courses in the vector store"""
         try:
-            results = self.course_catalog.get()
-            if results and "ids" in results:
-                return len(results["ids"])
-            return 0
+            return self.course_catalog.count()
         except Exception as e:
             print(f"Error getting course count: {e}")
             return 0
@@ -241,7 +238,7 @@ class VectorStore:
         import json
 
         try:
-            results = self.course_catalog.get()
+            results = self.course_catalog.get(include=["metadatas"])
             if results and "metadatas" in results:
                 # Parse lessons JSON for each course
                 parsed_metadata = []
@@ -263,7 +260,7 @@ class VectorStore:
         """Get course link for a given course title"""
         try:
             # Get course by ID (title is the ID)
-            results = self.course_catalog.get(ids=[course_title])
+            results = self.course_catalog.get(ids=[course_title], include=["metadatas"])
             if results and "metadatas" in results and results["metadatas"]:
                 metadata = results["metadatas"][0]
                 return metadata.get("course_link")
@@ -278,7 +275,7 @@ class VectorStore:
 
         try:
             # Get course by ID (title is the ID)
-            results = self.course_catalog.get(ids=[course_title])
+            results = self.course_catalog.get(ids=[course_title], include=["metadatas"])
             if results and "metadatas" in results and results["metadatas"]:
                 metadata = results["metadatas"][0]
                 lessons_json = metadata.get("lessons_json")
@@ -291,3 +288,36 @@ class VectorStore:
             return None
         except Exception as e:
             print(f"Error getting lesson link: {e}")
+
+    def get_lesson_links(
+        self, pairs: Iterable[Tuple[str, int]]
+    ) -> Dict[Tuple[str, int], Optional[str]]:
+        """Get lesson links for several (course title, lesson number) pairs in one
+        catalog lookup"""
+        import json
+
+        pairs = list(pairs)
+        links = dict.fromkeys(pairs)
+        if not pairs:
+            return links
+
+        try:
+            # Fetch every course involved at once (title is the ID)
+            results = self.course_catalog.get(
+                ids=list({course_title for course_title, _ in pairs}),
+                include=["metadatas"],
+            )
+            links_by_course = {}
+            for course_title, metadata in zip(results["ids"], results["metadatas"]):
+                lessons = json.loads(metadata.get("lessons_json") or "[]")
+                links_by_course[course_title] = {
+                    lesson.get("lesson_number"): lesson.get("lesson_link")
+                    for lesson in lessons
+                }
+            for course_title, lesson_number in pairs:
+                links[(course_title, lesson_number)] = links_by_course.get(
+                    course_title, {}
+                ).get(lesson_number)
+        except Exception as e:
+            print(f"Error getting lesson links: {e}")
+        return links
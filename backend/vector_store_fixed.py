@@ -1,35 +1,200 @@
+import functools
+import hashlib
+import importlib.util
+import json
+import operator
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings
+from huggingface_hub import constants as hf_constants
 from models import Course, CourseChunk
 from sentence_transformers import SentenceTransformer
 
-
-@dataclass
+try:
+    import simsimd
+except ImportError:  # Optional SIMD distance kernels; NumPy matmul is the fallback
+    simsimd = None
+
+# Texts per forward pass when encoding documents
+ENCODE_BATCH_SIZE = 64
+
+# Every encode runs on this one thread, whichever request thread asks for it, so
+# the model's allocator caches stay warm and requests don't contend for cores
+_ENCODER_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="st-encode")
+
+# Chunks per Chroma add call
+ADD_BATCH_SIZE = 256
+
+# HNSW index settings for new collections. Embeddings are unit length, so cosine
+# distance is one dot product per comparison
+COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+# Content candidates fetched from the approximate index per requested result,
+# reranked by exact cosine distance in process
+RERANK_OVERSAMPLE = 2
+
+# Precisions for query embeddings held in memory and scored in process. Chroma
+# itself always stores float32; anything below fp32 trades rerank precision for
+# speed, so it is opt-in
+QUANTIZE_DTYPES = {"fp32": np.float32, "fp16": np.float16, "int8": np.int8}
+
+# Opt-in (log_queries=True) append-only log of searched queries, relative to the
+# Chroma path; warmup() encodes and runs the most recent ones to warm the caches
+# and index. Queries are buffered and written QUERY_LOG_FLUSH_SIZE at a time on
+# a background thread, never on the search path
+QUERY_LOG_FILE = "query_log.jsonl"
+QUERY_LOG_FLUSH_SIZE = 32
+WARMUP_QUERIES = 200
+_QUERY_LOG_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-log")
+
+# Int8 dynamically quantized exports of embedding models, one folder per model
+# under RAG_MODEL_CACHE, or the Hugging Face cache if that is unset. Kept apart
+# from the Chroma data so snapshots and clears leave them alone
+ONNX_EXPORT_DIR = "rag_onnx"
+QUANTIZED_ONNX_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+def _onnx_export_dir(model_name: str) -> str:
+    """Folder for the quantized ONNX export of model_name"""
+    cache_root = os.environ.get("RAG_MODEL_CACHE") or os.path.join(
+        hf_constants.HF_HOME, ONNX_EXPORT_DIR
+    )
+    return os.path.join(cache_root, model_name.replace("/", "--"))
+
+
+@functools.lru_cache(maxsize=4)
+def _load_embedding_model(model_name: str) -> SentenceTransformer:
+    """Load the model as a quantized ONNX Runtime session if onnxruntime is
+    installed, exporting it the first time; else on PyTorch. Every store
+    using the same model shares one loaded instance"""
+    print(f"Loading embedding model: {model_name}")
+    if importlib.util.find_spec("onnxruntime") is None:
+        return SentenceTransformer(model_name)
+
+    try:
+        import onnxruntime as ort
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        model_dir = _onnx_export_dir(model_name)
+        if not os.path.exists(os.path.join(model_dir, QUANTIZED_ONNX_FILE)):
+            # One-time export and int8 dynamic quantization
+            onnx_model = SentenceTransformer(model_name, backend="onnx")
+            onnx_model.save(model_dir)
+            export_dynamic_quantized_onnx_model(onnx_model, "avx512_vnni", model_dir)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count() or 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return SentenceTransformer(
+            model_dir,
+            backend="onnx",
+            model_kwargs={
+                "file_name": QUANTIZED_ONNX_FILE,
+                "provider": "CPUExecutionProvider",
+                "session_options": options,
+            },
+        )
+    except Exception as e:
+        print(f"Quantized ONNX model unavailable, using PyTorch: {e}")
+        return SentenceTransformer(model_name)
+
+
+# Content where clause builders, keyed by (filters by course, filters by lesson).
+# Metadata filters have no substring operator, so a course filter is the list of
+# catalog titles it matches. Chroma wants two conditions combined under an
+# explicit $and
+_WHERE_CLAUSES = {
+    (True, True): lambda titles, lesson: {
+        "$and": [{"course_title": {"$in": titles}}, {"lesson_number": lesson}]
+    },
+    (True, False): lambda titles, lesson: {"course_title": {"$in": titles}},
+    (False, True): lambda titles, lesson: {"lesson_number": lesson},
+    (False, False): lambda titles, lesson: None,
+}
+
+
+def _quantize(embeddings: np.ndarray, precision: str) -> np.ndarray:
+    """Cast unit float32 rows to a QUANTIZE_DTYPES precision. int8 rows are
+    scaled per vector without keeping the scale, which cosine ignores"""
+    if precision != "int8":
+        return embeddings.astype(QUANTIZE_DTYPES[precision], copy=False)
+    scale = np.abs(embeddings).max(axis=-1, keepdims=True)
+    scale[scale == 0] = 1.0
+    return np.round(embeddings / scale * 127).astype(np.int8)
+
+
+def _dequantize(embeddings: np.ndarray) -> np.ndarray:
+    """Float32 rows back from _quantize, rescaling int8 rows to unit length"""
+    rows = embeddings.astype(np.float32)
+    if embeddings.dtype == np.int8:
+        norms = np.linalg.norm(rows, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        rows /= norms
+    return rows
+
+
+def _rerank(
+    query: np.ndarray, candidates: np.ndarray, top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact cosine distances from a unit (or _quantize'd) query to unit float32
+    candidate rows; returns the positions of the top_k closest, nearest first,
+    and their distances"""
+    if simsimd is not None:
+        # Score in the query's precision: fewer bytes through the SIMD kernel
+        if query.dtype == np.int8:
+            candidates = _quantize(candidates, "int8")
+        else:
+            candidates = candidates.astype(query.dtype, copy=False)
+        distances = simsimd.cdist(query[None, :], candidates, metric="cosine")
+        distances = np.asarray(distances, dtype=np.float32)[0]
+    else:
+        distances = 1.0 - candidates @ _dequantize(query)
+    if top_k < len(distances):
+        top = np.argpartition(distances, top_k - 1)[:top_k]
+    else:
+        top = np.arange(len(distances))
+    top = top[np.argsort(distances[top], kind="stable")]
+    return top, distances[top]
+
+
+def _to_chroma(embeddings: np.ndarray) -> List[List[float]]:
+    """Convert float32 or quantized rows to the nested float lists Chroma's API
+    takes, at the call"""
+    if embeddings.dtype != np.float32:
+        embeddings = _dequantize(embeddings)
+    return embeddings.tolist()
+
+
+@dataclass(slots=True)
 class SearchResults:
     """Container for search results with metadata"""
 
     documents: List[str]
     metadata: List[Dict[str, Any]]
-    distances: List[float]
+    distances: List[float]  # Cosine distances in [0, 2]; lower is closer
     error: Optional[str] = None
 
     @classmethod
     def from_chroma(cls, chroma_results: Dict) -> "SearchResults":
         """Create SearchResults from ChromaDB query results"""
-        return cls(
-            documents=(
-                chroma_results["documents"][0] if chroma_results["documents"] else []
-            ),
-            metadata=(
-                chroma_results["metadatas"][0] if chroma_results["metadatas"] else []
-            ),
-            distances=(
-                chroma_results["distances"][0] if chroma_results["distances"] else []
-            ),
-        )
+        documents = chroma_results.get("documents") or [[]]
+        metadatas = chroma_results.get("metadatas") or [[]]
+        distances = chroma_results.get("distances") or [[]]
+        return cls(documents[0], metadatas[0], distances[0])
 
     @classmethod
     def empty(cls, error_msg: str) -> "SearchResults":
@@ -41,33 +206,144 @@ class SearchResults:
         return len(self.documents) == 0
 
 
+class QueryCache:
+    """Thread-safe LRU cache whose entries expire after a fixed time"""
+
+    def __init__(self, max_size: int = 2000, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counts since creation"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+
 class VectorStore:
     """Vector storage using ChromaDB with manual embedding handling to avoid Windows segfaults"""
 
-    def __init__(self, chroma_path: str, embedding_model: str, max_results: int = 5):
+    def __init__(
+        self,
+        chroma_path: str,
+        embedding_model: str,
+        max_results: int = 5,
+        quantize: str = "fp32",
+        log_queries: bool = False,
+    ):
+        if quantize not in QUANTIZE_DTYPES:
+            raise ValueError(
+                f"quantize must be one of {', '.join(QUANTIZE_DTYPES)}, "
+                f"not {quantize!r}"
+            )
+        self.chroma_path = chroma_path
         self.max_results = max_results
+        self.quantize = quantize  # Precision of cached query embeddings
 
         # Initialize sentence transformer model manually
-        print(f"Loading embedding model: {embedding_model}")
-        self.embedding_model = SentenceTransformer(embedding_model)
+        self.embedding_model = _load_embedding_model(embedding_model)
+
+        self._open_client()
 
+        # Recent search results and query embeddings; the data version in result
+        # keys makes every write invalidate earlier results
+        self._query_cache = QueryCache()
+        self._embedding_cache = QueryCache()
+        self._data_version = 0
+
+        # Runs the Chroma queries of a batch search concurrently
+        self._search_pool = ThreadPoolExecutor(max_workers=4)
+
+        # Searched queries are only kept on disk when asked for
+        self._query_log_path = (
+            os.path.join(chroma_path, QUERY_LOG_FILE) if log_queries else None
+        )
+        self._pending_queries: List[str] = []
+        self._query_log_lock = threading.Lock()
+
+    def _open_client(self):
+        """Open the Chroma client and collections on the files at chroma_path"""
         # Initialize ChromaDB client without built-in embedding function
         self.client = chromadb.PersistentClient(
-            path=chroma_path, settings=Settings(anonymized_telemetry=False)
+            path=self.chroma_path, settings=Settings(anonymized_telemetry=False)
         )
 
         # Create collections without embedding function (we'll handle manually)
         self.course_catalog = self._create_collection("course_catalog")
         self.course_content = self._create_collection("course_content")
 
+    def snapshot(self, dest: str):
+        """Copy the store's files, built index included, to dest so restore() can
+        bring them back without re-ingesting"""
+        shutil.copytree(self.chroma_path, dest, dirs_exist_ok=True)
+
+    def restore(self, src: str):
+        """Replace the store's data with a snapshot() copy and reopen it. Drops
+        Chroma's cached clients, so other stores in the process must reopen"""
+        self.client.clear_system_cache()
+        for name in os.listdir(self.chroma_path):
+            path = os.path.join(self.chroma_path, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        shutil.copytree(src, self.chroma_path, dirs_exist_ok=True)
+        self._open_client()
+        self._invalidate_results()
+
     def _create_collection(self, name: str):
-        """Create or get a ChromaDB collection without embedding function"""
-        return self.client.get_or_create_collection(name=name)
+        """Create or get a ChromaDB collection without embedding function.
+        Settings only apply on creation; existing collections keep theirs"""
+        return self.client.get_or_create_collection(
+            name=name, metadata=COLLECTION_METADATA
+        )
 
-    def _encode_texts(self, texts: List[str]) -> List[List[float]]:
-        """Manually encode texts to embeddings"""
-        embeddings = self.embedding_model.encode(texts)
-        return embeddings.tolist()
+    def _encode_texts(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Manually encode texts to float32 unit embeddings, one row per text"""
+        embeddings = _ENCODER_POOL.submit(
+            self.embedding_model.encode,
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).result()
+        return embeddings.astype(np.float32, copy=False)
 
     def search(
         self,
@@ -77,63 +353,298 @@ class VectorStore:
         limit: Optional[int] = None,
     ) -> SearchResults:
         """Search course content with manual embedding"""
+        return self.batch_search([query], [course_name], [lesson_number], limit)[0]
+
+    def batch_search(
+        self,
+        queries: List[str],
+        course_names: Optional[List[Optional[str]]] = None,
+        lesson_numbers: Optional[List[Optional[int]]] = None,
+        limit: Optional[int] = None,
+    ) -> List[SearchResults]:
+        """Search several queries at once, embedding them in a single model call"""
+        course_names = course_names or [None] * len(queries)
+        lesson_numbers = lesson_numbers or [None] * len(queries)
+        self._log_queries(queries)
+
+        # Serve repeated searches from the cache
+        keys = [
+            self._result_key(query, course_name, lesson_number, limit)
+            for query, course_name, lesson_number in zip(
+                queries, course_names, lesson_numbers
+            )
+        ]
+        results: List[Optional[SearchResults]] = [
+            self._query_cache.get(key) for key in keys
+        ]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if not misses:
+            return results
+
+        try:
+            embeddings = self._query_embeddings([queries[i] for i in misses])
+        except Exception as e:
+            print(f"Search error: {e}")
+            for i in misses:
+                results[i] = SearchResults.empty(f"Search failed: {str(e)}")
+            return results
+
+        # Query Chroma for the misses concurrently, keeping input order
+        futures = [
+            self._search_pool.submit(
+                self._query_content,
+                embedding,
+                course_names[i],
+                lesson_numbers[i],
+                limit,
+                keys[i],
+            )
+            for i, embedding in zip(misses, embeddings)
+        ]
+        for i, future in zip(misses, futures):
+            results[i] = future.result()
+        return results
+
+    def warmup(self, queries: Optional[List[str]] = None):
+        """Encode queries into the embedding cache and run them once unfiltered,
+        paging in the content index before the first real search. Defaults to
+        the most recent logged queries"""
+        if queries is None:
+            queries = self._recent_queries(WARMUP_QUERIES)
+        queries = list(dict.fromkeys(queries))
+        if not queries:
+            return
         try:
-            # Encode query
-            query_embedding = self._encode_texts([query])[0]
+            if self.course_content.count() == 0:
+                return
+            embeddings = self._query_embeddings(queries)
+            self.course_content.query(
+                query_embeddings=_to_chroma(np.stack(embeddings)),
+                n_results=max(self.max_results, 1),
+                include=[],
+            )
+            print(f"Warmed up with {len(queries)} recent queries")
+        except Exception as e:
+            print(f"Warmup failed: {e}")
 
-            # Build where clause for filtering
-            where_clause = {}
-            if course_name:
-                where_clause["course_title"] = {"$contains": course_name}
-            if lesson_number:
-                where_clause["lesson_number"] = lesson_number
+    def _recent_queries(self, n: int) -> List[str]:
+        """The last n logged queries, oldest first; trims the log to them"""
+        if self._query_log_path is None:
+            return []
+        self.flush_query_log()
+        # Read and trim on the log thread, so no append lands in between
+        return _QUERY_LOG_POOL.submit(self._read_query_log, n).result()
+
+    def _read_query_log(self, n: int) -> List[str]:
+        """Read the last n queries from the query log file and drop older ones"""
+        try:
+            with open(self._query_log_path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return []
 
-            # Search in content collection
+        recent = lines[-n:]
+        if len(lines) > n:
+            with open(self._query_log_path, "w", encoding="utf-8") as f:
+                f.writelines(recent)
+        queries = []
+        for line in recent:
+            try:
+                queries.append(json.loads(line))
+            except ValueError:
+                continue  # Skip a line cut short by an interrupted write
+        return queries
+
+    def _log_queries(self, queries: List[str]):
+        """Buffer searched queries for the query log, handing a full buffer to
+        the log thread"""
+        if self._query_log_path is None:
+            return
+        with self._query_log_lock:
+            self._pending_queries.extend(queries)
+            if len(self._pending_queries) < QUERY_LOG_FLUSH_SIZE:
+                return
+            pending, self._pending_queries = self._pending_queries, []
+        _QUERY_LOG_POOL.submit(self._write_query_log, pending)
+
+    def flush_query_log(self):
+        """Write buffered queries to the query log and wait for every write"""
+        if self._query_log_path is None:
+            return
+        with self._query_log_lock:
+            pending, self._pending_queries = self._pending_queries, []
+        # The log thread runs writes in order, so this one finishes last
+        _QUERY_LOG_POOL.submit(self._write_query_log, pending).result()
+
+    def _write_query_log(self, queries: List[str]):
+        """Append queries to the query log file"""
+        if not queries:
+            return
+        try:
+            with open(self._query_log_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(query) + "\n" for query in queries))
+        except OSError as e:
+            print(f"Could not log queries: {e}")
+
+    def _query_embeddings(self, queries: List[str]) -> List[np.ndarray]:
+        """Embeddings for queries, encoding only those not seen recently"""
+        embeddings = {query: self._embedding_cache.get(query) for query in queries}
+        uncached = [query for query, cached in embeddings.items() if cached is None]
+        if uncached:
+            encoded = _quantize(self._encode_texts(uncached), self.quantize)
+            for query, embedding in zip(uncached, encoded):
+                self._embedding_cache.put(query, embedding)
+                embeddings[query] = embedding
+        return [embeddings[query] for query in queries]
+
+    def _query_content(
+        self,
+        query_embedding: np.ndarray,
+        course_name: Optional[str],
+        lesson_number: Optional[int],
+        limit: Optional[int],
+        cache_key: tuple,
+    ) -> SearchResults:
+        """Run one filtered content query and cache its results"""
+        try:
+            titles = self._matching_titles(course_name) if course_name else None
+            if titles == []:
+                # No course matches the filter, so no content can either
+                search_results = SearchResults(documents=[], metadata=[], distances=[])
+                self._query_cache.put(cache_key, search_results)
+                return search_results
+
+            # Build where clause for filtering from the template for its shape
+            where_clause = _WHERE_CLAUSES[bool(course_name), lesson_number is not None](
+                titles, lesson_number
+            )
+
+            # Search in content collection, oversampling the approximate index
+            n_results = limit or self.max_results
             results = self.course_content.query(
-                query_embeddings=[query_embedding],
-                n_results=limit or self.max_results,
-                where=where_clause if where_clause else None,
+                query_embeddings=_to_chroma(query_embedding[None, :]),
+                n_results=n_results * RERANK_OVERSAMPLE,
+                where=where_clause,
+                include=["documents", "metadatas", "embeddings"],
             )
 
-            return SearchResults.from_chroma(results)
+            search_results = self._reranked(query_embedding, results, n_results)
+            self._query_cache.put(cache_key, search_results)
+            return search_results
 
         except Exception as e:
             print(f"Search error: {e}")
             return SearchResults.empty(f"Search failed: {str(e)}")
 
+    def _matching_titles(self, course_name: str) -> List[str]:
+        """Catalog titles containing course_name, ignoring case"""
+        term = course_name.lower()
+        return [
+            title
+            for title in self.get_existing_course_titles()
+            if term in title.lower()
+        ]
+
+    def _reranked(
+        self, query_embedding: np.ndarray, chroma_results: Dict, limit: int
+    ) -> SearchResults:
+        """Keep the limit candidates closest to the query by exact distance"""
+        embeddings = chroma_results.get("embeddings")
+        if embeddings is None or len(embeddings) == 0 or len(embeddings[0]) == 0:
+            return SearchResults(documents=[], metadata=[], distances=[])
+
+        candidates = np.asarray(embeddings[0], dtype=np.float32)
+        top, distances = _rerank(query_embedding, candidates, limit)
+        documents = chroma_results["documents"][0]
+        metadata = chroma_results["metadatas"][0]
+        return SearchResults(
+            documents=[documents[i] for i in top],
+            metadata=[metadata[i] for i in top],
+            distances=distances.tolist(),
+        )
+
+    def _result_key(
+        self,
+        query: str,
+        course_name: Optional[str],
+        lesson_number: Optional[int],
+        limit: Optional[int],
+    ) -> tuple:
+        """Cache key for one search against the current data"""
+        text = f"{query}|{course_name or ''}|{lesson_number}|{limit}"
+        digest = hashlib.blake2b(text.encode("utf-8")).digest()
+        return (self._data_version, digest)
+
+    def _invalidate_results(self):
+        """Make cached search results stale after the stored data changes"""
+        self._data_version += 1
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Search result cache hits, misses and hit rate"""
+        return self._query_cache.stats()
+
+    @staticmethod
+    def _course_text(course: Course) -> str:
+        """Text embedded for a course in the catalog"""
+        course_text = f"Course: {course.title}"
+        if course.instructor:
+            course_text += f" by {course.instructor}"
+
+        # Add lessons info
+        if course.lessons:
+            lesson_titles = [
+                f"Lesson {lesson.lesson_number}: {lesson.title}"
+                for lesson in course.lessons
+            ]
+            course_text += f" Lessons: {', '.join(lesson_titles)}"
+        return course_text
+
     def add_course_metadata(self, course: Course):
         """Add course metadata to catalog"""
+        self.add_courses_metadata([course])
+
+    def add_courses_metadata(self, courses: List[Course]):
+        """Add metadata for several courses to the catalog, encoding them in one
+        model call"""
         try:
-            # Prepare course text for embedding
-            course_text = f"Course: {course.title}"
-            if course.instructor:
-                course_text += f" by {course.instructor}"
-
-            # Add lessons info
-            if course.lessons:
-                lesson_titles = [
-                    f"Lesson {lesson.lesson_number}: {lesson.title}"
-                    for lesson in course.lessons
-                ]
-                course_text += f" Lessons: {', '.join(lesson_titles)}"
+            if not courses:
+                return
+
+            # The title is the catalog id, so keep one course per title, the last
+            # one winning; Chroma rejects a batch that repeats an id
+            courses = list({course.title: course for course in courses}.values())
 
             # Encode and add to catalog
-            embedding = self._encode_texts([course_text])[0]
+            course_texts = [self._course_text(course) for course in courses]
+            embeddings = self._encode_texts(course_texts)
 
             self.course_catalog.add(
-                documents=[course_text],
-                embeddings=[embedding],
+                documents=course_texts,
+                embeddings=_to_chroma(embeddings),
                 metadatas=[
                     {
                         "course_title": course.title,
                         "instructor": course.instructor or "Unknown",
                         "num_lessons": len(course.lessons),
                         "course_link": course.course_link,
+                        "lessons_json": json.dumps(
+                            [
+                                {
+                                    "lesson_number": lesson.lesson_number,
+                                    "lesson_title": lesson.title,
+                                    "lesson_link": lesson.lesson_link,
+                                }
+                                for lesson in course.lessons
+                            ]
+                        ),
                     }
+                    for course in courses
                 ],
-                ids=[f"course_{course.title}"],
+                ids=[f"course_{course.title}" for course in courses],
             )
-            print(f"Added course metadata: {course.title}")
+            self._invalidate_results()
+            for course in courses:
+                print(f"Added course metadata: {course.title}")
 
         except Exception as e:
             print(f"Error adding course metadata: {e}")
@@ -144,36 +655,42 @@ class VectorStore:
             if not course_chunks:
                 return
 
-            # Prepare data for batch insertion
-            documents = [chunk.content for chunk in course_chunks]
-            embeddings = self._encode_texts(documents)
-
-            metadatas = []
-            ids = []
-
-            for i, chunk in enumerate(course_chunks):
-                metadata = {
-                    "course_title": chunk.course_title,
-                    "chunk_index": chunk.chunk_index,
-                }
-                if chunk.lesson_number is not None:
-                    metadata["lesson_number"] = chunk.lesson_number
-
-                metadatas.append(metadata)
-                ids.append(f"chunk_{chunk.course_title}_{chunk.chunk_index}")
+            # Prepare data for batch insertion, reading each chunk's fields once
+            fields = operator.attrgetter(
+                "content", "course_title", "chunk_index", "lesson_number"
+            )
+            rows = [fields(chunk) for chunk in course_chunks]
+            documents = [content for content, _, _, _ in rows]
+            ids = [f"chunk_{title}_{index}" for _, title, index, _ in rows]
+            metadatas = [
+                (
+                    {"course_title": title, "chunk_index": index}
+                    if lesson_number is None
+                    else {
+                        "course_title": title,
+                        "chunk_index": index,
+                        "lesson_number": lesson_number,
+                    }
+                )
+                for _, title, index, lesson_number in rows
+            ]
 
-            # Add to collection in batches to avoid memory issues
-            batch_size = 50
-            for i in range(0, len(documents), batch_size):
-                end_idx = min(i + batch_size, len(documents))
+            # Encode every chunk in one call: encode() sorts the whole list by
+            # length before batching (and restores the order), so each batch
+            # pads to similar lengths
+            embeddings = self._encode_texts(documents, batch_size=ENCODE_BATCH_SIZE)
 
+            # Add to the collection in batches, one at a time: Chroma makes no
+            # promise that concurrent writes to one collection are safe
+            for i in range(0, len(documents), ADD_BATCH_SIZE):
                 self.course_content.add(
-                    documents=documents[i:end_idx],
-                    embeddings=embeddings[i:end_idx],
-                    metadatas=metadatas[i:end_idx],
-                    ids=ids[i:end_idx],
+                    documents=documents[i : i + ADD_BATCH_SIZE],
+                    embeddings=_to_chroma(embeddings[i : i + ADD_BATCH_SIZE]),
+                    metadatas=metadatas[i : i + ADD_BATCH_SIZE],
+                    ids=ids[i : i + ADD_BATCH_SIZE],
                 )
 
+            self._invalidate_results()
             print(f"Added {len(course_chunks)} content chunks")
 
         except Exception as e:
@@ -189,11 +706,41 @@ class VectorStore:
     def get_existing_course_titles(self) -> List[str]:
         """Get list of existing course titles"""
         try:
-            results = self.course_catalog.get()
+            results = self.course_catalog.get(include=["metadatas"])
             return [meta.get("course_title", "") for meta in results["metadatas"]]
         except:
             return []
 
+    def get_lesson_links(
+        self, pairs: Iterable[Tuple[str, int]]
+    ) -> Dict[Tuple[str, int], Optional[str]]:
+        """Get lesson links for several (course title, lesson number) pairs in one
+        catalog lookup"""
+        pairs = list(pairs)
+        links = dict.fromkeys(pairs)
+        if not pairs:
+            return links
+
+        try:
+            results = self.course_catalog.get(
+                ids=[f"course_{title}" for title in {title for title, _ in pairs}],
+                include=["metadatas"],
+            )
+            links_by_course = {}
+            for metadata in results["metadatas"]:
+                lessons = json.loads(metadata.get("lessons_json") or "[]")
+                links_by_course[metadata.get("course_title")] = {
+                    lesson.get("lesson_number"): lesson.get("lesson_link")
+                    for lesson in lessons
+                }
+            for course_title, lesson_number in pairs:
+                links[(course_title, lesson_number)] = links_by_course.get(
+                    course_title, {}
+                ).get(lesson_number)
+        except Exception as e:
+            print(f"Error getting lesson links: {e}")
+        return links
+
     def clear_all_data(self):
         """Clear all data from collections"""
         try:
@@ -203,6 +750,7 @@ class VectorStore:
 
             self.course_catalog = self._create_collection("course_catalog")
             self.course_content = self._create_collection("course_content")
+            self._invalidate_results()
 
             print("Cleared all vector store data")
         except Exception as e:
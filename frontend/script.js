@@ -75,7 +75,7 @@ async function sendMessage() {
     chatMessages.scrollTop = chatMessages.scrollHeight;
 
     try {
-        const response = await fetch(`${API_URL}/query`, {
+        const response = await fetch(`${API_URL}/query/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -88,20 +88,40 @@ async function sendMessage() {
 
         if (!response.ok) throw new Error('Query failed');
 
-        const data = await response.json();
-        
-        // Update session ID if new
-        if (!currentSessionId) {
-            currentSessionId = data.session_id;
-        }
+        let answer = '';
+        let streamingMessage = null;
 
-        // Replace loading message with response
-        loadingMessage.remove();
-        addMessage(data.answer, 'assistant', data.sources);
+        await readEventStream(response, (event) => {
+            if (event.error) throw new Error(event.error);
+
+            if (event.delta !== undefined) {
+                answer += event.delta;
+
+                // Replace loading message with the partial answer on first text
+                if (!streamingMessage) {
+                    loadingMessage.remove();
+                    streamingMessage = createStreamingMessage();
+                    chatMessages.appendChild(streamingMessage);
+                }
+                streamingMessage.querySelector('.message-content').innerHTML = marked.parse(answer);
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            } else if (event.sources !== undefined) {
+                // Update session ID if new
+                if (!currentSessionId) {
+                    currentSessionId = event.session_id;
+                }
+
+                // Render the final message with its sources
+                loadingMessage.remove();
+                if (streamingMessage) streamingMessage.remove();
+                addMessage(answer, 'assistant', event.sources);
+            }
+        });
 
     } catch (error) {
-        // Replace loading message with error
+        // Replace loading message (or partial answer) with error
         loadingMessage.remove();
+        chatMessages.querySelectorAll('.message.streaming').forEach(el => el.remove());
         addMessage(`Error: ${error.message}`, 'assistant');
     } finally {
         chatInput.disabled = false;
@@ -110,6 +130,35 @@ async function sendMessage() {
     }
 }
 
+// Read server-sent events from a fetch response, calling onEvent for each payload
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const event of events) {
+            if (event.startsWith('data: ')) {
+                onEvent(JSON.parse(event.slice(6)));
+            }
+        }
+    }
+}
+
+function createStreamingMessage() {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant streaming';
+    messageDiv.innerHTML = '<div class="message-content"></div>';
+    return messageDiv;
+}
+
 function createLoadingMessage() {
     const messageDiv = document.createElement('div');
     messageDiv.className = 'message assistant';
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 """
 Development script for formatting code automatically.
+
+The tools are imported and run in this interpreter, not spawned through
+uv, so run the script from the project environment:
+
+    uv run python scripts/format_code.py
 """
 
-import subprocess
 import sys
+from typing import Callable, Optional
 
 # Ensure proper encoding for Windows
 if sys.platform == "win32":
@@ -12,26 +17,38 @@ if sys.platform == "win32":
     os.system("chcp 65001 >nul")
 
 
-def run_command(command: list[str], description: str) -> bool:
-    """Run a command and return True if successful."""
+def black(*args: str) -> Optional[int]:
+    """Run black in this process."""
+    from black import main as black_main
+    return black_main(list(args))
+
+
+def isort(*args: str) -> Optional[int]:
+    """Run isort in this process."""
+    from isort.main import main as isort_main
+    return isort_main(list(args))
+
+
+def run_command(tool: Callable[..., Optional[int]], args: list[str], description: str) -> bool:
+    """Run a tool in-process and return True if successful."""
     print(f"\n[FORMAT] {description}")
-    print(f"Running: {' '.join(command)}")
+    print(f"Running: {tool.__name__} {' '.join(args)}")
     
+    # The tools' CLI entry points end with sys.exit; None or 0 means success
     try:
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
-        if result.stdout:
-            print(result.stdout)
-        print(f"[DONE] {description} - COMPLETED")
-        return True
-    except subprocess.CalledProcessError as e:
+        exit_code = tool(*args)
+    except SystemExit as e:
+        exit_code = e.code
+    except ImportError as e:
+        print(f"[FAIL] {description} - FAILED")
+        print(f"{tool.__name__} is not installed: {e}")
+        return False
+    
+    if exit_code:
         print(f"[FAIL] {description} - FAILED")
-        if e.stdout:
-            print("STDOUT:")
-            print(e.stdout)
-        if e.stderr:
-            print("STDERR:")
-            print(e.stderr)
         return False
+    print(f"[DONE] {description} - COMPLETED")
+    return True
 
 
 def main():
@@ -39,13 +56,13 @@ def main():
     print("[START] Auto-formatting code...")
     
     formatting_steps = [
-        (["uv", "run", "isort", "."], "Sorting imports with isort"),
-        (["uv", "run", "black", "."], "Formatting code with black"),
+        (isort, ["."], "Sorting imports with isort"),
+        (black, ["."], "Formatting code with black"),
     ]
     
     results = []
-    for command, description in formatting_steps:
-        success = run_command(command, description)
+    for tool, args, description in formatting_steps:
+        success = run_command(tool, args, description)
         results.append((description, success))
     
     print("\n" + "="*50)
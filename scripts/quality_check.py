@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 """
 Development script for running code quality checks.
+
+The tools are imported and run in this interpreter, not spawned through
+uv, so run the script from the project environment:
+
+    uv run python scripts/quality_check.py
 """
 
-import subprocess
+import contextlib
+import io
 import sys
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, Tuple, Union
 
 # Ensure proper encoding for Windows
 if sys.platform == "win32":
@@ -13,26 +20,63 @@ if sys.platform == "win32":
     os.system("chcp 65001 >nul")
 
 
-def run_command(command: list[str], description: str) -> bool:
-    """Run a command and return True if successful."""
+def black(*args: str) -> Optional[int]:
+    """Run black in this process."""
+    from black import main as black_main
+    return black_main(list(args))
+
+
+def isort(*args: str) -> Optional[int]:
+    """Run isort in this process."""
+    from isort.main import main as isort_main
+    return isort_main(list(args))
+
+
+def flake8(*args: str) -> Optional[int]:
+    """Run flake8 in this process."""
+    from flake8.main.cli import main as flake8_main
+    return flake8_main(list(args))
+
+
+def mypy(*args: str) -> Optional[int]:
+    """Run mypy in this process."""
+    from mypy import api
+    stdout, stderr, exit_status = api.run(list(args))
+    if stdout:
+        print(stdout)
+    if stderr:
+        print(stderr)
+    return exit_status
+
+
+def run_command(tool: Callable[..., Optional[int]], args: list[str]) -> Tuple[Union[int, str, None], str]:
+    """Run a tool in-process and return its exit code and captured output."""
+    # A byte-backed stream, since flake8 writes to sys.stdout.buffer
+    output = io.TextIOWrapper(io.BytesIO(), encoding="utf-8", write_through=True)
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        # The tools' CLI entry points end with sys.exit; None or 0 means success
+        try:
+            exit_code = tool(*args)
+        except SystemExit as e:
+            exit_code = e.code
+        except ImportError as e:
+            print(f"{tool.__name__} is not installed: {e}")
+            exit_code = 1
+    return exit_code, output.buffer.getvalue().decode("utf-8", "replace")
+
+
+def report(tool: Callable[..., Optional[int]], args: list[str], description: str, exit_code: Union[int, str, None], output: str) -> bool:
+    """Print a finished check's output and return True if it passed."""
     print(f"\n[CHECK] {description}")
-    print(f"Running: {' '.join(command)}")
+    print(f"Running: {tool.__name__} {' '.join(args)}")
+    if output:
+        print(output.rstrip())
     
-    try:
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
-        if result.stdout:
-            print(result.stdout)
-        print(f"[PASS] {description} - PASSED")
-        return True
-    except subprocess.CalledProcessError as e:
+    if exit_code:
         print(f"[FAIL] {description} - FAILED")
-        if e.stdout:
-            print("STDOUT:")
-            print(e.stdout)
-        if e.stderr:
-            print("STDERR:")
-            print(e.stderr)
         return False
+    print(f"[PASS] {description} - PASSED")
+    return True
 
 
 def main():
@@ -40,16 +84,21 @@ def main():
     print("[START] Running code quality checks...")
     
     checks = [
-        (["uv", "run", "black", "--check", "."], "Black formatting check"),
-        (["uv", "run", "isort", "--check-only", "."], "Import sorting check"),
-        (["uv", "run", "flake8", "."], "Flake8 linting"),
-        (["uv", "run", "mypy", "."], "Type checking with mypy"),
+        (black, ["--check", "."], "Black formatting check"),
+        (isort, ["--check-only", "."], "Import sorting check"),
+        (flake8, ["."], "Flake8 linting"),
+        (mypy, ["."], "Type checking with mypy"),
     ]
     
+    # The checks are independent, so run each in its own process and report
+    # them in order as they finish
     results = []
-    for command, description in checks:
-        success = run_command(command, description)
-        results.append((description, success))
+    with ProcessPoolExecutor(max_workers=len(checks)) as pool:
+        futures = [pool.submit(run_command, tool, args) for tool, args, _ in checks]
+        for (tool, args, description), future in zip(checks, futures):
+            exit_code, output = future.result()
+            success = report(tool, args, description, exit_code, output)
+            results.append((description, success))
     
     print("\n" + "="*50)
     print("[SUMMARY] QUALITY CHECK SUMMARY")